@@ -5,8 +5,8 @@ export type ViewType = "scatterplot" | "bins (absolute)" | "bins (ground truth)"
 
 export type BinColorScaleType = "linear" | "log";
 
-export type LinearizationType = "z-order" | "knn" | "strip" | "random" | "z-order-geo" | "numeric" |
-                                "temporal";
+export type LinearizationType = "z-order" | "hilbert" | "knn" | "strip" | "random" | "z-order-geo" |
+                                "numeric" | "temporal";
 export type SubdivisionType = "cardinality" | "cohesion";
 export type SelectionType = "random" | "first" | "minimum" | "maximum" | "median";
 
@@ -17,7 +17,7 @@ export type SubdivisionParamType = {
   min_samples: number
 }
 
-export const linearizationTypes: LinearizationType[] = ["z-order", "knn", "strip", "random", "numeric", "temporal"];
+export const linearizationTypes: LinearizationType[] = ["z-order", "hilbert", "knn", "strip", "random", "numeric", "temporal"];
 export const subdivisionTypes: SubdivisionType[] = ["cardinality", "cohesion"];
 export const selectionTypes: SelectionType[] = ["first", "median", "minimum", "maximum", "random"];
 
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/pipeline/linearizations")
+from GraphLinearizations import *
+
+# Compares the networkx and sparse engines of the graph linearizations, and the locality of all
+# graph linearizations, measured as the average distance between the nodes of an edge in the
+# linearization. Graphs are generated as a random spanning tree plus random edges, which add
+# cycles and nodes of higher degree. The networkx engine is only run on the small graph, since it
+# does not finish on the large one. testGraphLinearizationEngines.py checks that both engines
+# return the same order.
+# Usage: python benchmarkGraphLinearization.py [n_edges] [n_nodes]
+N_EDGES = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+N_NODES = int(sys.argv[2]) if len(sys.argv) > 2 else N_EDGES // 2
+N_EDGES_SMALL = 5_000
+
+# linearizations with their engines (None for the ones that only have a single one)
+LINEARIZATIONS = [
+    (SpanningTreeGraphLinearization, ["networkx", "sparse"]),
+    (BasicGraphLinearization, ["networkx", "sparse"]),
+    (WeightedGraphLinearization, ["networkx", "sparse"]),
+    (ReverseCuthillMcKeeGraphLinearization, [None]),
+    (SpectralGraphLinearization, [None]),
+]
+
+
+def generate_graph(n_edges, n_nodes, seed=0):
+    """Returns the graph as data array with the columns id, source, target."""
+    rng = np.random.default_rng(seed)
+    parents = (rng.random(n_nodes - 1) * np.arange(1, n_nodes)).astype(np.int64)
+    tree = np.stack([parents, np.arange(1, n_nodes)], axis=1)
+    random_edges = rng.integers(0, n_nodes, (n_edges - len(tree), 2))
+    edges = rng.permutation(np.concatenate([tree, random_edges]))
+    return np.column_stack([np.arange(len(edges)), edges])
+
+
+def measure(linearization_class, engine, data):
+    linearization = linearization_class("benchmarkGraph", 2, data=data)
+    if engine is not None:
+        linearization.engine = engine
+    start = time.perf_counter()
+    try:
+        linearization.linearize()
+    except Exception as e:
+        return f"failed ({type(e).__name__})"
+    duration = time.perf_counter() - start
+    return f"{duration:8.2f}s  edge distance: {linearization.get_edge_locality():10.1f}"
+
+
+for n_edges, n_nodes, run_networkx in [
+    (N_EDGES_SMALL, N_EDGES_SMALL // 2, True),
+    (N_EDGES, N_NODES, False),
+]:
+    data = generate_graph(n_edges, n_nodes)
+    for linearization_class, engines in LINEARIZATIONS:
+        for engine in engines:
+            if engine == "networkx" and not run_networkx:
+                continue
+            result = measure(linearization_class, engine, data)
+            print(
+                f"{n_edges:>9} edges  {linearization_class.__name__:<38} "
+                f"{engine or '':<9} {result}"
+            )
@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+
+from pipeline import *
+
+# Compares build time and locality of the vectorized z-order and Hilbert linearizations on
+# synthetic data (uniform and clustered points in 2 and 4 dimensions). Locality is measured as the
+# distance between consecutive points in the linearization: the mean, and the 99th percentile,
+# which captures the big jumps that SubdivisionCohesion cuts at.
+N_POINTS = 1_000_000
+
+
+def generate_data(n_points, dimensions, clustered, seed=0):
+    rng = np.random.default_rng(seed)
+    if not clustered:
+        return rng.random((n_points, dimensions))
+
+    centers = rng.random((20, dimensions))
+    labels = rng.integers(0, len(centers), n_points)
+    data = centers[labels] + rng.normal(scale=0.03, size=(n_points, dimensions))
+    return (data - data.min(axis=0)) / (data.max(axis=0) - data.min(axis=0))
+
+
+def measure(order_function, data):
+    start = time.perf_counter()
+    order = order_function(data)
+    duration = time.perf_counter() - start
+
+    jumps = np.linalg.norm(np.diff(data[order], axis=0), axis=1)
+    return duration, jumps.mean(), np.quantile(jumps, 0.99)
+
+
+for dimensions in [2, 4]:
+    for clustered in [False, True]:
+        data = generate_data(N_POINTS, dimensions, clustered)
+        name = f"{dimensions}D {'clustered' if clustered else 'uniform'}"
+
+        for curve, order_function in [("z-order", z_order), ("hilbert", hilbert_order)]:
+            duration, mean_jump, p99_jump = measure(order_function, data)
+            print(
+                f"{name:<14} {curve:<8} build: {duration:6.2f}s  "
+                f"mean jump: {mean_jump:.5f}  99th percentile jump: {p99_jump:.5f}"
+            )
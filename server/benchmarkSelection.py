@@ -0,0 +1,59 @@
+import sys
+import time
+
+import numpy as np
+
+from pipeline import *
+
+# Measures the latency of next_chunk over a whole progression, i.e., until all rows of a synthetic
+# linearization have been selected, for each selection. The rows are split into buckets of equal
+# size, so that every chunk takes items from all buckets. Prints the mean latency of the chunks in
+# each tenth of the progression: since removing k items from a bucket costs O(k), independent of
+# the size of the bucket, the latency should stay flat as the buckets shrink.
+# Usage: python benchmarkSelection.py [n_rows] [n_buckets] [chunk_size]
+N_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+N_BUCKETS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+CHUNK_SIZE = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+N_PARTS = 10
+
+SELECTIONS = {
+    "random": lambda: SelectionRandom(),
+    "first": lambda: SelectionFirst(),
+    "minimum": lambda: SelectionMinimum(1),
+    "maximum": lambda: SelectionMaximum(1),
+    "median": lambda: SelectionMedian(1),
+    "autocorrelation": lambda: SelectionSpatialAutoCorrelation(3, 4),
+}
+
+
+def generate_data(n_rows, seed=0):
+    """Returns the data with the columns id, two uniform values, and two binary (H/L) values."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        [np.arange(n_rows), rng.random((n_rows, 2)), rng.integers(0, 2, (n_rows, 2))]
+    ).astype(np.float64)
+
+
+def measure(selection, buckets):
+    """Returns the latencies of all chunks until the buckets are empty."""
+    selection.load_subdivision(buckets)
+    latencies = []
+    while True:
+        start = time.perf_counter()
+        chunk = selection.next_chunk(CHUNK_SIZE)
+        latencies.append(time.perf_counter() - start)
+        if chunk is None:
+            return latencies[:-1]
+
+
+data = generate_data(N_ROWS)
+subdivision = SubdivisionCardinality(chunk_size=N_BUCKETS)
+subdivision.load_linearization(data)
+buckets = subdivision.subdivide()
+
+print(f"{N_ROWS} rows, {N_BUCKETS} buckets, chunks of {CHUNK_SIZE} rows")
+print(f"{'':<16}" + "".join(f"{f'{part * 10}%':>8}" for part in range(N_PARTS)))
+for name, create_selection in SELECTIONS.items():
+    latencies = measure(create_selection(), buckets.copy())
+    parts = np.array_split(np.array(latencies) * 1000, N_PARTS)
+    print(f"{name:<16}" + "".join(f"{part.mean():8.2f}" for part in parts) + "  ms")
@@ -0,0 +1,194 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pipeline import *
+
+# Builds several linearizations of a dataset in parallel. The data file is parsed only once, and
+# stored in the base file of the dataset, which the worker processes then memory-map, so that the
+# data is shared instead of being parsed (and held in memory) once per linearization.
+# Linearizations whose inputs did not change since they were last built are skipped.
+#
+# Example: python buildLinearizations.py mountainPeaks z-order hilbert knn --dimensions 3
+
+LINEARIZATION_FILES = pathlib.Path(__file__).parent / "pipeline" / "linearization_files"
+
+# name of the linearization file that each type writes
+LINEARIZATION_NAMES = {
+    "random": "Random",
+    "numeric": "SortByNumAttr",
+    "temporal": "SortByTempAttr",
+    "z-order": "ZOrder",
+    "hilbert": "Hilbert",
+    "knn": "NN",
+    "z-order-geo": "ZOrder",
+}
+
+
+def create_linearization(linearization_type, args, data, n_threads=-1):
+    params = {"exclude_attributes": args.exclude, "data": data}
+    if linearization_type == "random":
+        return LinearizationRandom(args.dataset, args.dimensions, **params)
+    elif linearization_type == "numeric":
+        return LinearizationNumericAttr(
+            args.dataset, args.dimensions, args.sort_attr, **params
+        )
+    elif linearization_type == "temporal":
+        return LinearizationDatetimeAttr(
+            args.dataset, args.dimensions, args.sort_attr, **params
+        )
+    elif linearization_type == "z-order":
+        return LinearizationZOrderKD(args.dataset, args.dimensions, **params)
+    elif linearization_type == "hilbert":
+        return LinearizationHilbert(args.dataset, args.dimensions, **params)
+    elif linearization_type == "knn":
+        return LinearizationNearestNeighbour(
+            args.dataset, args.dimensions, n_jobs=n_threads, **params
+        )
+    elif linearization_type == "z-order-geo":
+        return LinearizationGeoZorder(
+            args.dataset, args.dimensions, args.lat, args.lng, **params
+        )
+
+
+def get_fingerprint(linearization_type, args, data_file: pathlib.Path) -> str:
+    """Identifies the inputs of a linearization: the data file (by size and modification time)
+    and all parameters that the linearization depends on."""
+    stat = data_file.stat()
+    inputs = {
+        "data": [stat.st_size, stat.st_mtime_ns],
+        "type": linearization_type,
+        "dimensions": args.dimensions,
+        "exclude": [str(attribute) for attribute in args.exclude],
+    }
+    if linearization_type in ["numeric", "temporal"]:
+        inputs["sort_attr"] = args.sort_attr
+    elif linearization_type == "z-order-geo":
+        inputs["lat"], inputs["lng"] = args.lat, args.lng
+
+    return hashlib.md5(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def is_up_to_date(linearization_type, args, fingerprint: str) -> bool:
+    file_name = args.dataset + "Linearization" + LINEARIZATION_NAMES[linearization_type]
+    manifest_file = LINEARIZATION_FILES / (file_name + ".order.json")
+    if not (LINEARIZATION_FILES / (file_name + ".order.npy")).exists():
+        return False
+    elif not manifest_file.exists():
+        return False
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    return (
+        manifest.get("fingerprint") == fingerprint
+        and (LINEARIZATION_FILES / manifest["base"]).exists()
+    )
+
+
+def build(linearization_type, args, fingerprint, base_name, keys_file, n_threads):
+    """Runs in a worker process: builds a single linearization on the memory-mapped base file and
+    returns the time it took. Linearizations that use several threads use at most n_threads."""
+    start = time.perf_counter()
+    data = np.load(LINEARIZATION_FILES / base_name, mmap_mode="r")
+
+    if keys_file is not None:
+        # dates are not numeric, so the base file does not contain them: use their timestamps
+        data = np.array(data)
+        data[:, args.sort_attr] = np.load(keys_file)
+
+    linearization = create_linearization(linearization_type, args, data, n_threads)
+    linearization.fingerprint = fingerprint
+    linearization.linearize()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Builds linearizations of a dataset in parallel."
+    )
+    parser.add_argument("dataset", help="name of the dataset, e.g. mountainPeaks")
+    parser.add_argument(
+        "types", nargs="+", choices=list(LINEARIZATION_NAMES.keys()), metavar="type"
+    )
+    parser.add_argument("--dimensions", type=int, default=2)
+    parser.add_argument("--exclude", type=int, nargs="*", default=[])
+    parser.add_argument("--sort-attr", type=int, default=1)
+    parser.add_argument("--lat", type=int, default=1)
+    parser.add_argument("--lng", type=int, default=2)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if the inputs are unchanged"
+    )
+    args = parser.parse_args()
+
+    if "z-order" in args.types and "z-order-geo" in args.types:
+        parser.error("z-order and z-order-geo write the same file, choose one of them")
+
+    data_file = (
+        pathlib.Path(__file__).parent
+        / "pipeline"
+        / "linearizations"
+        / "datasets"
+        / (args.dataset + "Data.csv")
+    )
+    fingerprints = {t: get_fingerprint(t, args, data_file) for t in args.types}
+    types = [
+        t
+        for t in args.types
+        if args.force or not is_up_to_date(t, args, fingerprints[t])
+    ]
+    for t in args.types:
+        if t not in types:
+            print(f"{t:<12} skipped, inputs are unchanged")
+    if len(types) == 0:
+        return
+
+    start = time.perf_counter()
+    # parses the data file, which is shared with the workers via the base file
+    parsed = LinearizationRandom(args.dataset, args.dimensions, args.exclude)
+    base_name = parsed.write_base_data(force=True)
+    print(f"{'parsing':<12} {time.perf_counter() - start:8.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        keys_file = None
+        if "temporal" in types:
+            keys = pd.to_datetime(parsed.data[:, args.sort_attr])
+            keys = np.where(keys.isna(), np.nan, keys.asi8.astype(np.float64))
+            keys_file = pathlib.Path(tmp_folder) / "keys.npy"
+            np.save(keys_file, keys)
+        del parsed
+
+        # the cores are split between the workers, so that the threads of the neighbour queries of
+        # the knn linearization do not compete with the other workers
+        n_workers = max(min(args.jobs, len(types)), 1)
+        n_threads = max((os.cpu_count() or 1) // n_workers, 1)
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(
+                    build,
+                    t,
+                    args,
+                    fingerprints[t],
+                    base_name,
+                    keys_file if t == "temporal" else None,
+                    n_threads,
+                ): t
+                for t in types
+            }
+            for future in as_completed(futures):
+                print(f"{futures[future]:<12} {future.result():8.2f}s")
+
+    print(f"{'total':<12} {time.perf_counter() - start:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import os
+import pathlib
+import numpy as np
+
+
+class Buckets:
+    """Buckets of a subdivision in compressed form: one index array lists the rows of all buckets,
+    and bucket i spans index[starts[i] : ends[i]] except for the gap of its removed rows."""
+
+    consumed = None
+    # slot (position in the index array) of each row, built on demand by remove_rows()
+    row_slots = None
+    # copies of the buckets sorted by a column of the linearization, by column, see sorted_by()
+    sorted_copies = None
+
+    def __init__(self, linearization, offsets: np.ndarray, index=None, keys=None):
+        """Bucket i contains the rows index[offsets[i] : offsets[i + 1]] of the linearization, or
+        the rows offsets[i] to offsets[i + 1], if no index is given. Keys are the labels of the
+        buckets (by default their position in offsets). Empty buckets are omitted."""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        keys = np.arange(len(offsets) - 1) if keys is None else np.asarray(keys)
+        is_not_empty = offsets[1:] > offsets[:-1]
+
+        self.linearization = linearization
+        self.keys = keys[is_not_empty]
+        self.starts = offsets[:-1][is_not_empty]
+        self.ends = offsets[1:][is_not_empty]
+        # an empty gap is kept at the end of its bucket
+        self.gap_starts = self.ends.copy()
+        self.gap_ends = self.ends.copy()
+
+        if index is None:
+            index = np.arange(offsets[-1] if len(offsets) > 0 else 0)
+        self.index = np.asarray(index).astype(_index_dtype(len(linearization)))
+
+    def __len__(self):
+        """Number of buckets that are not empty."""
+        return int(np.count_nonzero(self.get_sizes()))
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.get_sizes().sum())
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + 4 * self.starts.nbytes
+
+    def get_sizes(self) -> np.ndarray:
+        return self.ends - self.starts - (self.gap_ends - self.gap_starts)
+
+    def get_size(self, bucket: int) -> int:
+        return int(
+            self.ends[bucket]
+            - self.starts[bucket]
+            - (self.gap_ends[bucket] - self.gap_starts[bucket])
+        )
+
+    def get_non_empty(self) -> np.ndarray:
+        """The bucket numbers of all buckets that are not empty, in ascending order."""
+        return np.flatnonzero(self.get_sizes())
+
+    def get_indeces(self, bucket: int, positions=None) -> np.ndarray:
+        """Row indeces into the linearization of the items at the given positions in the bucket
+        (all of them by default)."""
+        if positions is not None:
+            return self.index[self._get_item_slots(bucket, positions)]
+
+        start, end = self.starts[bucket], self.ends[bucket]
+        gap_start, gap_end = self.gap_starts[bucket], self.gap_ends[bucket]
+        if gap_start == gap_end:
+            return self.index[start:end]
+        return np.concatenate([self.index[start:gap_start], self.index[gap_end:end]])
+
+    def get_rows(self, bucket: int, positions=None) -> np.ndarray:
+        """The rows of the items at the given positions in the bucket (all of them by default)."""
+        return np.asarray(self.linearization[self.get_indeces(bucket, positions)])
+
+    def get_column(self, bucket: int, column: int) -> np.ndarray:
+        return np.asarray(self.linearization[self.get_indeces(bucket), column])
+
+    def get_remaining(self):
+        """Returns the row indeces of all items in all buckets, ordered by bucket, and the bucket
+        number and position in the bucket of each of them."""
+        slots, buckets, positions = self._get_slots()
+        return self.index[slots], buckets, positions
+
+    def get_item_indeces(self, buckets: np.ndarray, positions: np.ndarray):
+        """Row indeces of the items at the given positions in the given buckets (one bucket number
+        per item), e.g., of the items that a selection picked from several buckets at once."""
+        return self.index[self._get_item_slots(buckets, positions)]
+
+    def remove(self, bucket: int, positions, keep_order=True) -> np.ndarray:
+        """Removes the items at the given positions from the bucket and returns their row indeces.
+        The remaining items keep their order, unless keep_order is False, which allows removing any
+        k items in O(k)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        buckets = np.full(len(positions), bucket, dtype=np.int64)
+        return self.remove_items(buckets, positions, keep_order)
+
+    def remove_rows(self, rows: np.ndarray, keep_order=True) -> np.ndarray:
+        """Removes the items with the given row indeces, whichever buckets they are in. Rows that
+        are not in the buckets (anymore) are ignored."""
+        buckets, positions, is_present = self.locate_rows(rows)
+        return self.remove_items(buckets[is_present], positions[is_present], keep_order)
+
+    def locate_rows(self, rows: np.ndarray):
+        """Returns the bucket number and position in the bucket of the items with the given row
+        indeces, and whether each row is in the buckets at all (otherwise, its bucket number and
+        position are meaningless)."""
+        if self.row_slots is None:
+            slots, _, _ = self._get_slots()
+            self.row_slots = np.full(
+                len(self.linearization), -1, dtype=self.index.dtype
+            )
+            self.row_slots[self.index[slots]] = slots
+
+        # the spans of the buckets in the index array are in the order of the buckets. Slots of
+        # removed rows are not reset, so check that they still hold the row within its bucket.
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self.starts) == 0:
+            empty = np.zeros(len(rows), dtype=np.int64)
+            return empty, empty, np.zeros(len(rows), dtype=bool)
+
+        slots = self.row_slots[rows].astype(np.int64)
+        buckets = np.maximum(np.searchsorted(self.starts, slots, side="right") - 1, 0)
+        gap_starts, gap_ends = self.gap_starts[buckets], self.gap_ends[buckets]
+        is_present = (
+            (slots >= self.starts[buckets])
+            & (slots < self.ends[buckets])
+            & ((slots < gap_starts) | (slots >= gap_ends))
+        )
+        is_present[is_present] = self.index[slots[is_present]] == rows[is_present]
+
+        is_after_gap = slots >= gap_ends
+        gap_widths = gap_ends - gap_starts
+        positions = slots - self.starts[buckets] - np.where(is_after_gap, gap_widths, 0)
+        return buckets, positions, is_present
+
+    def remove_items(self, buckets: np.ndarray, positions: np.ndarray, keep_order=True):
+        """Removes the items at the given positions in the given buckets (one bucket number per
+        item) and returns their row indeces, ordered by bucket and position. All buckets are
+        updated at once, only buckets that have to be compacted are handled one by one."""
+        buckets = np.asarray(buckets, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        order = np.lexsort((positions, buckets))
+        buckets, positions = buckets[order], positions[order]
+        is_unique = np.ones(len(buckets), dtype=bool)
+        is_unique[1:] = (buckets[1:] != buckets[:-1]) | (
+            positions[1:] != positions[:-1]
+        )
+        buckets, positions = buckets[is_unique], positions[is_unique]
+
+        rows = self.index[self._get_item_slots(buckets, positions)]
+        if len(rows) == 0:
+            return rows
+        if self.consumed is not None:
+            self.consumed[rows] = True
+
+        # the removed items of each bucket: their number and the first and last of them
+        first_items = np.flatnonzero(np.diff(buckets, prepend=-1))
+        last_items = np.append(first_items[1:], len(buckets)) - 1
+        removed = buckets[first_items]
+        counts = last_items - first_items + 1
+        firsts, stops = positions[first_items], positions[last_items] + 1
+
+        start, end = self.starts[removed], self.ends[removed]
+        gap_start, gap_end = self.gap_starts[removed], self.gap_ends[removed]
+        n_left = gap_start - start
+        sizes = end - start - (gap_end - gap_start)
+        has_gap = gap_start != gap_end
+
+        # how each bucket is updated, see the class documentation
+        is_all = counts == sizes
+        is_swap = ~is_all & ~has_gap & (not keep_order)
+        is_run = ~is_all & ~is_swap & (stops - firsts == counts)
+        is_head = is_run & (firsts == 0)
+        is_tail = is_run & ~is_head & (stops == sizes)
+        is_new_gap = is_run & ~is_head & ~is_tail & ~has_gap
+        is_wider_gap = (
+            is_run
+            & ~is_head
+            & ~is_tail
+            & has_gap
+            & (firsts <= n_left)
+            & (n_left <= stops)
+        )
+        is_compacted = ~(
+            is_all | is_swap | is_head | is_tail | is_new_gap | is_wider_gap
+        )
+
+        new_start, new_end = start.copy(), end.copy()
+        new_gap_start, new_gap_end = gap_start.copy(), gap_end.copy()
+        is_gap_cleared = is_all | is_swap
+
+        new_end[is_all] = start[is_all]
+        new_end[is_swap] = (start + sizes - counts)[is_swap]
+
+        is_before_gap = stops < n_left
+        new_start = np.where(is_head & is_before_gap, start + stops, new_start)
+        new_start = np.where(
+            is_head & ~is_before_gap, gap_end + stops - n_left, new_start
+        )
+        is_gap_cleared |= is_head & ~is_before_gap
+
+        is_after_gap = firsts > n_left
+        new_end = np.where(is_tail & is_after_gap, gap_end + firsts - n_left, new_end)
+        new_end = np.where(is_tail & ~is_after_gap, start + firsts, new_end)
+        is_gap_cleared |= is_tail & ~is_after_gap
+
+        is_gap_moved = is_new_gap | is_wider_gap
+        new_gap_start = np.where(is_gap_moved, start + firsts, new_gap_start)
+        new_gap_end = np.where(is_new_gap, start + stops, new_gap_end)
+        new_gap_end = np.where(is_wider_gap, gap_end + stops - n_left, new_gap_end)
+        new_gap_start = np.where(is_gap_cleared, new_end, new_gap_start)
+        new_gap_end = np.where(is_gap_cleared, new_end, new_gap_end)
+
+        if is_swap.any():
+            is_swap_item = np.repeat(is_swap, counts)
+            self._swap_remove(
+                buckets[is_swap_item],
+                positions[is_swap_item],
+                (sizes - counts)[is_swap],
+            )
+
+        for bucket, first, last in zip(
+            removed[is_compacted], first_items[is_compacted], last_items[is_compacted]
+        ):
+            self._compact(bucket, positions[first : last + 1])
+
+        is_updated = ~is_compacted
+        updated = removed[is_updated]
+        self.starts[updated] = new_start[is_updated]
+        self.ends[updated] = new_end[is_updated]
+        self.gap_starts[updated] = new_gap_start[is_updated]
+        self.gap_ends[updated] = new_gap_end[is_updated]
+        return rows
+
+    def _swap_remove(self, buckets, positions, n_kept):
+        # fills the slots of the removed items with the last items of their buckets, which have no
+        # gaps. The items are ordered by bucket, n_kept is the number of items that each keeps.
+        first_items = np.flatnonzero(np.diff(buckets, prepend=-1))
+        counts = np.diff(np.append(first_items, len(buckets)))
+        starts = self.starts[buckets[first_items]]
+
+        slots = self.starts[buckets] + positions
+        holes = slots[positions < np.repeat(n_kept, counts)]
+        tail_slots = np.repeat(starts + n_kept, counts) + concatenated_ranges(counts)
+        moved = tail_slots[~np.isin(tail_slots, slots)]
+
+        # both the holes and the moved items are ordered by bucket, with as many of each per bucket
+        self.index[holes] = self.index[moved]
+        if self.row_slots is not None:
+            self.row_slots[self.index[holes]] = holes
+
+    def _compact(self, bucket: int, positions: np.ndarray):
+        remaining = np.delete(self.get_indeces(bucket), positions)
+        start = self.starts[bucket]
+        self.index[start : start + len(remaining)] = remaining
+        self.ends[bucket] = start + len(remaining)
+        self._clear_gap(bucket)
+        if self.row_slots is not None:
+            self.row_slots[remaining] = np.arange(start, start + len(remaining))
+
+    def _clear_gap(self, bucket: int):
+        self.gap_starts[bucket] = self.ends[bucket]
+        self.gap_ends[bucket] = self.ends[bucket]
+
+    def remove_consumed(self):
+        """Removes the items flagged in `consumed`, e.g., because they were removed from a copy of
+        the buckets. The remaining items keep their order."""
+        if self.consumed is None:
+            return
+
+        slots, buckets, _ = self._get_slots()
+        is_kept = ~self.consumed[self.index[slots]]
+        if is_kept.all():
+            return
+
+        kept_buckets = buckets[is_kept]
+        sizes = np.bincount(kept_buckets, minlength=len(self.starts))
+        first_item = np.cumsum(sizes) - sizes
+        positions = np.arange(len(kept_buckets)) - first_item[kept_buckets]
+        self.index[self.starts[kept_buckets] + positions] = self.index[slots[is_kept]]
+        self.ends = self.starts + sizes
+        self.gap_starts = self.ends.copy()
+        self.gap_ends = self.ends.copy()
+        self.row_slots = None
+
+    def rebase(self, linearization, rows: np.ndarray):
+        """Turns buckets over linearization[rows] into buckets over the linearization."""
+        self.linearization = linearization
+        self.index = np.asarray(rows)[self.index].astype(
+            _index_dtype(len(linearization))
+        )
+        self.row_slots = None
+        self.sorted_copies = None
+
+    def sort_by(self, column: int):
+        """Sorts the items of each bucket by their value in the given column of the linearization,
+        ascending (and by their current order for equal values)."""
+        slots, buckets, _ = self._get_slots()
+        indeces = self.index[slots]
+        values = np.asarray(self.linearization[indeces, column])
+        self.index[slots] = indeces[np.lexsort((values, buckets))]
+        self.row_slots = None
+
+    def split_by(self, labels: np.ndarray, n_labels: int) -> "Buckets":
+        """Splits each bucket by a label per item, given in the order of get_remaining(): item j of
+        bucket i goes into bucket n_labels * i + labels[j] of the returned buckets, or is left out
+        if its label is -1. The items keep their order, and empty buckets are kept, so that the
+        bucket numbers follow from the labels."""
+        slots, buckets, _ = self._get_slots()
+        labels = np.asarray(labels, dtype=np.int64)
+        is_labeled = labels >= 0
+        groups = n_labels * buckets[is_labeled] + labels[is_labeled]
+        order = np.argsort(groups, kind="stable")
+
+        sizes = np.bincount(groups, minlength=n_labels * len(self.starts))
+        ends = np.cumsum(sizes)
+        return Buckets._from_arrays(
+            self.linearization,
+            self.index[slots[is_labeled][order]],
+            ends - sizes,
+            ends,
+            ends.copy(),
+            ends.copy(),
+            np.arange(len(sizes)),
+        )
+
+    def sorted_by(self, column: int) -> "Buckets":
+        """Copy of the buckets with the items of each bucket sorted by the given column (see
+        sort_by). If the buckets flag removed rows in `consumed`, the copy is kept and shares it, so
+        that all selections by the same column sort the buckets only once: rows that were removed
+        from the buckets or any of their sorted copies since are removed from the copy before it is
+        returned, without changing its order."""
+        if self.consumed is None:
+            buckets = self.copy()
+            buckets.sort_by(column)
+            return buckets
+
+        if self.sorted_copies is None:
+            self.sorted_copies = {}
+        if column not in self.sorted_copies:
+            buckets = self.copy()
+            buckets.remove_consumed()
+            buckets.sort_by(column)
+            self.sorted_copies[column] = buckets
+
+        buckets = self.sorted_copies[column]
+        buckets.consumed = self.consumed
+        buckets.remove_consumed()
+        return buckets
+
+    def copy(self):
+        """Copy of the buckets that shares the linearization (and `consumed`), but not the index,
+        so that items can be removed from one of them without affecting the other."""
+        buckets = Buckets._from_arrays(
+            self.linearization,
+            self.index.copy(),
+            self.starts.copy(),
+            self.ends.copy(),
+            self.gap_starts.copy(),
+            self.gap_ends.copy(),
+            self.keys,
+        )
+        buckets.consumed = self.consumed
+        return buckets
+
+    def save(self, file: pathlib.Path):
+        """Writes the buckets (but not the linearization) into an .npz file."""
+        tmp_file = file.with_name(file.name + ".tmp")
+        with open(tmp_file, "wb") as f:
+            np.savez(
+                f,
+                index=self.index,
+                starts=self.starts,
+                ends=self.ends,
+                gap_starts=self.gap_starts,
+                gap_ends=self.gap_ends,
+                keys=self.keys,
+            )
+        os.replace(tmp_file, file)
+
+    @staticmethod
+    def load(file: pathlib.Path, linearization):
+        """Reads buckets of the linearization, which were written by save()."""
+        with np.load(file) as arrays:
+            # files written before buckets had gaps do not contain them
+            has_gaps = "gap_starts" in arrays.files
+            return Buckets._from_arrays(
+                linearization,
+                arrays["index"],
+                arrays["starts"],
+                arrays["ends"],
+                arrays["gap_starts"] if has_gaps else arrays["ends"].copy(),
+                arrays["gap_ends"] if has_gaps else arrays["ends"].copy(),
+                arrays["keys"],
+            )
+
+    @staticmethod
+    def _from_arrays(linearization, index, starts, ends, gap_starts, gap_ends, keys):
+        buckets = Buckets.__new__(Buckets)
+        buckets.linearization = linearization
+        buckets.index = index
+        buckets.starts = starts
+        buckets.ends = ends
+        buckets.gap_starts = gap_starts
+        buckets.gap_ends = gap_ends
+        buckets.keys = keys
+        return buckets
+
+    def to_dict(self) -> dict:
+        """The buckets as a dict, which maps the key of each bucket to a copy of its rows."""
+        return {
+            self.keys[bucket]: self.get_rows(bucket) for bucket in self.get_non_empty()
+        }
+
+    def _get_slots(self):
+        # the positions in the index array of all items, with their bucket and position in it
+        sizes = self.get_sizes()
+        buckets = np.repeat(np.arange(len(sizes)), sizes)
+        positions = concatenated_ranges(sizes)
+        return self._get_item_slots(buckets, positions), buckets, positions
+
+    def _get_item_slots(self, buckets, positions) -> np.ndarray:
+        # the positions in the index array of the items at the given positions in the buckets
+        slots = self.starts[buckets] + np.asarray(positions, dtype=np.int64)
+        gap_starts, gap_ends = self.gap_starts[buckets], self.gap_ends[buckets]
+        return np.where(slots >= gap_starts, slots + (gap_ends - gap_starts), slots)
+
+
+def concatenated_ranges(counts: np.ndarray) -> np.ndarray:
+    """The concatenation of np.arange(count) for all counts, e.g., the position of each item in its
+    bucket, given the number of items per bucket."""
+    counts = np.asarray(counts, dtype=np.int64)
+    first_items = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(first_items, counts)
+
+
+def _index_dtype(n_rows: int):
+    # row indeces of linearizations with less than 2^31 rows fit into half the memory
+    return np.int32 if n_rows < 2**31 else np.int64
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import os
+import threading
+
+
+class LRUCache:
+    """Process-wide, thread-safe cache that evicts the least recently used entries once the summed
+    size of all entries exceeds a memory budget (in bytes). The size of an entry is its `nbytes`
+    attribute (0 if it has none)."""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """Returns the entry stored for key. On a miss, load() is called to produce the entry,
+        which is then stored. Entries are shared between callers, so they must not be mutated."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        # load outside of the lock, so that slow reads do not block hits on other entries
+        value = load()
+
+        with self._lock:
+            if key in self._entries:
+                # another thread loaded the same entry in the meantime, so share that one
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            if _sizeof(value) <= self.budget:
+                self._entries[key] = value
+                self.size += _sizeof(value)
+                self._evict()
+
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def set_budget(self, budget: int):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self.size,
+                "budget": self.budget,
+            }
+
+    def _evict(self):
+        while self.size > self.budget and len(self._entries) > 0:
+            _, value = self._entries.popitem(last=False)
+            self.size -= _sizeof(value)
+            self.evictions += 1
+
+
+def _sizeof(value) -> int:
+    return int(getattr(value, "nbytes", 0))
+
+
+# budget for the linearizations shared by all pipelines, can be set via environment variable
+LINEARIZATION_CACHE_BUDGET = (
+    int(os.environ.get("PROSAMPLE_CACHE_BUDGET_MB", 4096)) * 2**20
+)
+LINEARIZATION_CACHE = LRUCache(LINEARIZATION_CACHE_BUDGET)
+
+# budget for the subdivisions (i.e., the buckets of a linearization) shared by all pipelines
+SUBDIVISION_CACHE_BUDGET = (
+    int(os.environ.get("PROSAMPLE_SUBDIVISION_CACHE_BUDGET_MB", 1024)) * 2**20
+)
+SUBDIVISION_CACHE = LRUCache(SUBDIVISION_CACHE_BUDGET)
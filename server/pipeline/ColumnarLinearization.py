@@ -0,0 +1,185 @@
+from abc import ABC, abstractmethod
+import pathlib
+import threading
+import numpy as np
+
+# pyarrow is an optional dependency, only needed for the columnar (.arrow/.parquet) files
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class ColumnSource(ABC):
+    """Provides the columns of a linearization file, loading each column on its first access."""
+
+    n_rows = 0
+    n_columns = 0
+
+    def __init__(self) -> None:
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def column(self, index: int) -> np.ndarray:
+        with self._lock:
+            if index not in self._columns:
+                column = np.asarray(self._read_column(index), dtype=np.float64)
+                column.flags.writeable = False
+                self._columns[index] = column
+            return self._columns[index]
+
+    @property
+    def nbytes(self):
+        return self.n_rows * self.n_columns * np.dtype(np.float64).itemsize
+
+    def get_loaded_columns(self) -> list[int]:
+        return sorted(self._columns.keys())
+
+    @abstractmethod
+    def _read_column(self, index: int) -> np.ndarray:
+        pass
+
+
+class ArrayColumnSource(ColumnSource):
+    """Columns of a two-dimensional (e.g., memory-mapped) array. Columns are strided views on the
+    array, so they are not copied."""
+
+    def __init__(self, array: np.ndarray) -> None:
+        super().__init__()
+        self.array = array
+        self.n_rows, self.n_columns = array.shape
+
+    def _read_column(self, index):
+        return self.array[:, index]
+
+
+class ArrowColumnSource(ColumnSource):
+    """Columns of an Arrow IPC file. The file is memory-mapped, so columns are not paged in before
+    they are accessed."""
+
+    def __init__(self, file: pathlib.Path) -> None:
+        super().__init__()
+        self.table = pa.ipc.open_file(pa.memory_map(str(file), "r")).read_all()
+        self.n_rows = self.table.num_rows
+        self.n_columns = self.table.num_columns
+
+    def _read_column(self, index):
+        return self.table.column(index).to_numpy()
+
+
+class ParquetColumnSource(ColumnSource):
+    """Columns of a Parquet file. Each column is read (and decoded) from disk on its first
+    access."""
+
+    def __init__(self, file: pathlib.Path) -> None:
+        super().__init__()
+        self.file = file
+        metadata = pq.ParquetFile(str(file)).metadata
+        self.names = metadata.schema.names
+        self.n_rows = metadata.num_rows
+        self.n_columns = len(self.names)
+
+    def _read_column(self, index):
+        table = pq.read_table(str(self.file), columns=[self.names[index]])
+        return table.column(0).to_numpy()
+
+
+class LazyLinearization:
+    """Read-only, two-dimensional view on the rows of a ColumnSource, which mimics the parts of the
+    ndarray interface used by the subdivisions and selections. Indexing by columns (e.g.
+    linearization[:, 3]) only loads these columns, indexing by rows (e.g. linearization[10:20])
+    returns another view without loading anything. Full rows are only materialized when the view
+    is converted into an ndarray."""
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, source: ColumnSource, rows=None, shares_source=False) -> None:
+        self.source = source
+        # either a range (for contiguous rows) or an array of row indeces into the source
+        self.rows = range(source.n_rows) if rows is None else rows
+        # whether the source is shared with other views and cached on its own (like the base data
+        # of permutation linearizations), so that only the row indeces count towards nbytes
+        self.shares_source = shares_source
+
+    @property
+    def shape(self):
+        return (len(self.rows), self.source.n_columns)
+
+    @property
+    def nbytes(self):
+        if self.shares_source:
+            return getattr(self.rows, "nbytes", 0)
+        return len(self.rows) * self.source.n_columns * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load_columns(self, columns: list[int]):
+        """Loads the given columns ahead of time, e.g., all columns needed by a pipeline."""
+        for column in columns:
+            self.source.column(int(column))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            row_key, column_key = key
+        else:
+            row_key, column_key = key, slice(None)
+
+        rows = self._get_rows(row_key)
+        columns = self._get_columns(column_key)
+
+        if isinstance(column_key, (int, np.integer)):
+            return self._take(columns[0], rows)
+        elif isinstance(rows, (int, np.integer)):
+            return np.array([self._take(column, rows) for column in columns])
+        elif isinstance(column_key, slice) and column_key == slice(None):
+            return LazyLinearization(self.source, rows, self.shares_source)
+
+        return self._stack(columns, rows)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self._stack(range(self.source.n_columns), self.rows)
+        return array if dtype is None else array.astype(dtype)
+
+    def __iter__(self):
+        return iter(np.asarray(self))
+
+    def tolist(self):
+        return np.asarray(self).tolist()
+
+    def _get_rows(self, key):
+        if isinstance(key, slice):
+            return self.rows[key]
+        elif isinstance(key, (int, np.integer)):
+            return self.rows[key]
+
+        key = np.asarray(key)
+        key = np.flatnonzero(key) if key.dtype == bool else key.astype(np.intp)
+        if isinstance(self.rows, range):
+            return self.rows.start + key * self.rows.step
+        return self.rows[key]
+
+    def _get_columns(self, key):
+        if isinstance(key, (int, np.integer)):
+            return [int(key)]
+        elif isinstance(key, slice):
+            return range(self.source.n_columns)[key]
+        return [int(column) for column in np.asarray(key).ravel()]
+
+    def _take(self, column: int, rows):
+        values = self.source.column(column)
+        if isinstance(rows, range) and rows.step > 0:
+            return values[rows.start : rows.stop : rows.step]
+        elif isinstance(rows, range):
+            return values[np.asarray(rows)]
+        return values[rows]
+
+    def _stack(self, columns, rows) -> np.ndarray:
+        n_rows = len(rows) if not isinstance(rows, (int, np.integer)) else 1
+        array = np.empty((n_rows, len(columns)), dtype=self.dtype)
+        for i, column in enumerate(columns):
+            array[:, i] = self._take(column, rows)
+        return array
@@ -1,18 +1,154 @@
 from abc import ABC, abstractmethod
+import json
+import os
 import numpy as np
+import pandas as pd
 import pathlib
 
+from .Cache import LINEARIZATION_CACHE
+from .ColumnarLinearization import *
+
+# csv files (and their modification times) that could not be imported into the binary format, so
+# that the import is only attempted again once the csv file changes
+FAILED_IMPORTS = {}
+
 
 class LinearizationReader(ABC):
     file_ending = ""
+    # folder that the linearization files are read from
+    files_folder = pathlib.Path(__file__).parent.absolute() / "linearization_files"
 
-    def read_linearization(self, data_set_name):
-        current_folder = pathlib.Path(__file__).parent.absolute()
+    def get_file_path(self, data_set_name, suffix=".csv") -> pathlib.Path:
         file_name = f"{data_set_name}{self.file_ending}"
-        file_to_read = current_folder / "linearization_files" / file_name
-        linearization = np.genfromtxt(file_to_read, skip_header=1, delimiter=";")
+        return (pathlib.Path(self.files_folder) / file_name).with_suffix(suffix)
+
+    def read_linearization(
+        self, data_set_name, columns: list[int] = None, file: pathlib.Path = None
+    ):
+        """Opens the most recently written (.order.npy, .npy, .arrow, .parquet or imported csv)
+        file of the linearization, unless the file is given, and shares it through the cache."""
+        file_to_read = file or self.get_linearization_file(data_set_name)
+        key = (data_set_name, self.file_ending, file_to_read.stat().st_mtime_ns)
+        linearization = LINEARIZATION_CACHE.get(
+            key, lambda: _load_linearization(file_to_read)
+        )
+
+        if isinstance(linearization, LazyLinearization):
+            linearization.load_columns(columns or [])
         return linearization
 
+    def get_linearization_file(self, data_set_name) -> pathlib.Path:
+        suffixes = [".order.npy", ".npy"]
+        if pa is not None:
+            suffixes += [".arrow", ".parquet"]
+
+        files = [self.get_file_path(data_set_name, suffix) for suffix in suffixes]
+        files = [file for file in files if file.exists()]
+
+        csv_file = self.get_file_path(data_set_name, ".csv")
+        if all(_is_newer(csv_file, file) for file in files):
+            if FAILED_IMPORTS.get(csv_file) != csv_file.stat().st_mtime_ns:
+                self.import_csv(data_set_name)
+            npy_file = self.get_file_path(data_set_name, ".npy")
+
+            # fall back to the csv file if it could not be imported
+            if not npy_file.exists() or _is_newer(csv_file, npy_file):
+                return csv_file
+            return npy_file
+
+        return max(files, key=lambda file: file.stat().st_mtime_ns)
+
+    def iter_linearization(
+        self, data_set_name, block_size=1_000_000, columns=None, file=None
+    ):
+        """Yields the linearization in blocks of at most block_size rows (restricted to the given
+        columns), so that it can be processed in a single pass without loading it into memory."""
+        linearization = self.read_linearization(data_set_name, file=file)
+        for start in range(0, len(linearization), block_size):
+            block = linearization[start : start + block_size]
+            yield np.asarray(block if columns is None else block[:, columns])
+
+    def import_csv(self, data_set_name, block_size=1_000_000):
+        """Converts the csv file into the binary format block by block, so that files larger than
+        the available memory can be imported."""
+        csv_file = self.get_file_path(data_set_name, ".csv")
+        npy_file = self.get_file_path(data_set_name, ".npy")
+        tmp_file = npy_file.with_suffix(".npy.tmp")
+
+        # first pass finds the shape of the data, second pass copies it into the binary file
+        n_rows, n_columns = 0, 0
+        for block in _read_csv_blocks(csv_file, block_size):
+            n_rows += len(block)
+            n_columns = block.shape[1]
+
+        try:
+            linearization = np.lib.format.open_memmap(
+                tmp_file, mode="w+", dtype=np.float64, shape=(n_rows, n_columns)
+            )
+            offset = 0
+            for block in _read_csv_blocks(csv_file, block_size):
+                linearization[offset : offset + len(block)] = block
+                offset += len(block)
+            linearization.flush()
+            del linearization
+            os.replace(tmp_file, npy_file)
+
+            manifest = {
+                "format": "npy",
+                "source": csv_file.name,
+                "shape": [n_rows, n_columns],
+                "dtype": "float64",
+            }
+            with open(npy_file.with_suffix(".json"), "w") as f:
+                json.dump(manifest, f)
+        except OSError as error:
+            print(f"could not import {csv_file.name} into binary format: {error}")
+            FAILED_IMPORTS[csv_file] = csv_file.stat().st_mtime_ns
+
+
+def _read_csv_blocks(file: pathlib.Path, block_size: int):
+    # like np.genfromtxt, skip the header line and turn values that are not numeric into NaN
+    blocks = pd.read_csv(file, sep=";", header=None, skiprows=1, chunksize=block_size)
+    for block in blocks:
+        block = block.apply(pd.to_numeric, errors="coerce")
+        yield block.to_numpy(dtype=np.float64)
+
+
+def _load_linearization(file: pathlib.Path):
+    if file.name.endswith(".order.npy"):
+        return _load_permutation(file)
+    elif file.suffix == ".arrow":
+        return LazyLinearization(ArrowColumnSource(file))
+    elif file.suffix == ".parquet":
+        return LazyLinearization(ParquetColumnSource(file))
+    elif file.suffix == ".npy":
+        return np.load(file, mmap_mode="r")
+
+    # cached arrays are shared between pipelines, so protect them against modifications
+    linearization = np.genfromtxt(file, skip_header=1, delimiter=";")
+    linearization.flags.writeable = False
+    return linearization
+
+
+def _load_permutation(file: pathlib.Path) -> LazyLinearization:
+    with open(file.with_name(file.name.replace(".order.npy", ".order.json"))) as f:
+        manifest = json.load(f)
+
+    # the base data is cached separately, so that all linearizations of a dataset share it
+    base_file = file.with_name(manifest["base"])
+    key = (base_file.name, base_file.stat().st_mtime_ns)
+    source = LINEARIZATION_CACHE.get(
+        key, lambda: ArrayColumnSource(np.load(base_file, mmap_mode="r"))
+    )
+
+    order = np.load(file)
+    order.flags.writeable = False
+    return LazyLinearization(source, order, shares_source=True)
+
+
+def _is_newer(file: pathlib.Path, other: pathlib.Path) -> bool:
+    return file.exists() and file.stat().st_mtime > other.stat().st_mtime
+
 
 class LinearizationReaderTest(LinearizationReader):
     file_ending = "LinearizationTest.csv"
@@ -22,6 +158,10 @@ class LinearizationReaderZOrder(LinearizationReader):
     file_ending = "LinearizationZOrder.csv"
 
 
+class LinearizationReaderHilbert(LinearizationReader):
+    file_ending = "LinearizationHilbert.csv"
+
+
 class LinearizationReaderNumeric(LinearizationReader):
     file_ending = "LinearizationSortByNumAttr.csv"
 
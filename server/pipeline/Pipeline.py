@@ -1,5 +1,16 @@
+import time
+import numpy as np
 from . import *
 
+# number of buckets of the cardinality and interval subdivisions and bins of the cohesion
+# subdivision, unless they are tuned to a latency budget
+DEFAULT_GRANULARITY = {"n_buckets": 1000, "n_bins": 100}
+# tuning never creates buckets with fewer rows than this
+MIN_BUCKET_SIZE = 10
+# number of buckets (and rows) that the selection is calibrated on
+CALIBRATION_SIZE = 200
+CALIBRATION_RUNS = 3
+
 
 class Pipeline:
     def __init__(self, config):
@@ -10,7 +21,18 @@ class Pipeline:
             "selection": config["selection"],
             "params": config["params"],
             "dimension": int(config["dimension"]),
+            "streaming": config.get("streaming", False),
+            "persist_subdivisions": config.get("persist_subdivisions", False),
+            # target time per chunk in ms, which the granularity of the subdivisions is tuned to
+            # (None keeps the default granularity)
+            "latency_budget": config.get("latency_budget"),
+            "chunk_size": int(config.get("chunk_size", 1000)),
+            # "float32" or "float64" (None keeps the dtype of the linearization)
+            "chunk_dtype": config.get("chunk_dtype"),
         }
+        self.granularity = dict(DEFAULT_GRANULARITY)
+        # chunks are selected into this buffer, which is reused for all chunks
+        self.chunk_buffer = None
 
         # retrieves next chunk given the current_selection
         self.sampler = self._get_sampler()
@@ -18,16 +40,105 @@ class Pipeline:
     def _get_sampler(self):
         dataset_name = _resolve_data(self.config["data"])
         self.linearization = self._get_linearization(self.config["linearization"])
-        self.subdivision = self._get_subdivision(self.config["subdivision"])
         self.selection = self._get_selection(self.config["selection"])
 
+        if self.config["latency_budget"] is not None and None not in [
+            dataset_name,
+            self.selection,
+        ]:
+            self.granularity = self._tune_granularity(dataset_name)
+
+        self.subdivision = self._get_subdivision(self.config["subdivision"])
+
         if None in [dataset_name, self.linearization, self.subdivision, self.selection]:
             return None
 
         return Sampler(
-            dataset_name, self.linearization, self.subdivision, self.selection
+            dataset_name,
+            self.linearization,
+            self.subdivision,
+            self.selection,
+            self._get_required_columns(),
+            self.config["streaming"],
+            persist_subdivisions=self.config["persist_subdivisions"],
         )
 
+    def _get_required_columns(self):
+        """Lists the columns this configuration reads besides the ones rendered by the client
+        (x/y), so that they can be loaded upfront from columnar linearization files."""
+        params = self.config["params"]
+        columns = [1, 2, self.config["dimension"]]
+        columns += params.get("subspace", [])
+
+        for param in ["coverage", "value_h_index", "lag_h_index"]:
+            if param in params:
+                columns += [int(params[param])]
+
+        return sorted(set(columns))
+
+    def _tune_granularity(self, dataset_name):
+        """Picks the number of buckets (and bins) for the latency budget per chunk. More buckets
+        stratify the data more finely, but the selection does work per bucket it selects from, so
+        a calibration run of the selection first measures its cost per chunk, per bucket and per
+        row."""
+        linearization = self.linearization.read_linearization(
+            dataset_name, self._get_required_columns()
+        )
+        chunk_size = min(self.config["chunk_size"], len(linearization))
+        costs = self._calibrate_selection(linearization)
+
+        # more buckets than rows in a chunk do not stratify the chunk any further, and buckets
+        # should not get too small
+        max_buckets = min(chunk_size, len(linearization) // MIN_BUCKET_SIZE)
+        n_buckets = np.arange(1, max(max_buckets, 1) + 1)
+        latency = _estimate_latency(n_buckets, chunk_size, *costs)
+
+        # as many buckets as the budget allows (or a single one, if it cannot be met)
+        budget = float(self.config["latency_budget"]) / 1000
+        within_budget = n_buckets[latency <= budget]
+        n_buckets = int(within_budget.max()) if len(within_budget) > 0 else 1
+
+        return {
+            "n_buckets": n_buckets,
+            "n_bins": n_buckets,
+            "latency_budget_ms": budget * 1000,
+            "estimated_latency_ms": float(
+                _estimate_latency(n_buckets, chunk_size, *costs) * 1000
+            ),
+            "chunk_cost_ms": costs[0] * 1000,
+            "bucket_cost_ms": costs[1] * 1000,
+            "row_cost_ms": costs[2] * 1000,
+        }
+
+    def _calibrate_selection(self, linearization):
+        """Measures the time the selection takes per chunk, per bucket and per selected row: a chunk
+        of CALIBRATION_SIZE rows is selected from as many buckets of MIN_BUCKET_SIZE rows, and from
+        a single bucket with all these rows, and a chunk of a single row from that bucket (best of
+        CALIBRATION_RUNS runs each)."""
+        size = min(CALIBRATION_SIZE, len(linearization) // MIN_BUCKET_SIZE)
+        size = max(size, 1)
+        rows = linearization[: size * MIN_BUCKET_SIZE]
+
+        def measure(offsets, chunk_size):
+            durations = []
+            for _ in range(CALIBRATION_RUNS):
+                selection = self._get_selection(self.config["selection"])
+                selection.load_subdivision(Buckets(rows, offsets))
+                start = time.perf_counter()
+                selection.next_chunk(chunk_size)
+                durations += [time.perf_counter() - start]
+            return min(durations)
+
+        many_buckets = measure(np.arange(0, len(rows) + 1, MIN_BUCKET_SIZE), size)
+        single_bucket = measure(np.array([0, len(rows)]), size)
+        single_row = measure(np.array([0, len(rows)]), 1)
+
+        # the measurements differ by size - 1 rows, or by size - 1 buckets
+        row_cost = max(single_bucket - single_row, 0) / max(size - 1, 1)
+        bucket_cost = max(many_buckets - single_bucket, 0) / max(size - 1, 1)
+        chunk_cost = max(single_row - bucket_cost - row_cost, 0)
+        return chunk_cost, bucket_cost, row_cost
+
     def _get_linearization(self, linearization_string):
         lin_class = _resolve_linearization(linearization_string)
         linearization = lin_class()
@@ -37,14 +148,16 @@ class Pipeline:
         sub_class = _resolve_subdivision(subdivision_string)
         subdivision = None
 
+        n_buckets = self.granularity["n_buckets"]
         if sub_class == SubdivisionCardinality:
-            subdivision = sub_class(chunk_size=1000)
+            subdivision = sub_class(chunk_size=n_buckets)
         elif sub_class == SubdivisionInterval:
             subspace = self.config["params"]["subspace"]
-            subdivision = sub_class(chunk_size=1000, attribute=subspace[0])
+            subdivision = sub_class(chunk_size=n_buckets, attribute=subspace[0])
         elif sub_class == SubdivisionCohesion:
             subspace = self.config["params"]["subspace"]
-            subdivision = sub_class(n_bins=100, attributes=subspace)
+            n_bins = self.granularity["n_bins"]
+            subdivision = sub_class(n_bins=n_bins, attributes=subspace)
         elif sub_class == SubdivisionCoverage:
             attribute = self.config["params"]["coverage"]
             subdivision = sub_class(attribute=attribute)
@@ -87,8 +200,27 @@ class Pipeline:
         self.subdivision = self._get_subdivision(new_subdivision)
         self.sampler.update_subdivision(self.subdivision)
 
-    def get_next_chunk(self, chunk_size: int = 1000):
-        return self.sampler.sample(self.selection, chunk_size)
+    def get_next_chunk(self, chunk_size: int = None):
+        """The next chunk (of chunk_size rows of the config by default, which the granularity is
+        tuned for), as a view on the chunk buffer of the pipeline. The buffer is overwritten by the
+        next chunk, so the chunk has to be copied (e.g., by tolist()) if it is kept."""
+        if chunk_size is None:
+            chunk_size = self.config["chunk_size"]
+        buffer = self._get_chunk_buffer(chunk_size) if chunk_size > -1 else None
+        return self.sampler.sample(self.selection, chunk_size, buffer)
+
+    def _get_chunk_buffer(self, chunk_size: int):
+        linearization = self.sampler.linearization
+        dtype = _resolve_chunk_dtype(self.config["chunk_dtype"]) or linearization.dtype
+        shape = (chunk_size, linearization.shape[1])
+
+        if (
+            self.chunk_buffer is None
+            or self.chunk_buffer.dtype != dtype
+            or len(self.chunk_buffer) < chunk_size
+        ):
+            self.chunk_buffer = np.empty(shape, dtype)
+        return self.chunk_buffer
 
     def get_config(self):
         return self.config
@@ -96,6 +228,17 @@ class Pipeline:
     def get_dataset_size(self):
         return self.sampler.get_dataset_size()
 
+    def get_info(self):
+        """Describes the pipeline: its configuration, the granularity of its subdivisions (and how
+        it was tuned), and the progress of the sampling."""
+        return {
+            "config": self.config,
+            "granularity": self.granularity,
+            "dataset_size": self.sampler.get_dataset_size(),
+            "remaining_size": int((~self.sampler.consumed).sum()),
+            "n_buckets": len(self.selection.subdivision),
+        }
+
 
 def _resolve_data(data):
     if data == "mountain_peaks":
@@ -115,6 +258,8 @@ def _resolve_linearization(linearization):
         return LinearizationReaderTest
     if linearization == "z-order":
         return LinearizationReaderZOrder
+    elif linearization == "hilbert":
+        return LinearizationReaderHilbert
     elif linearization == "numeric":
         return LinearizationReaderNumeric
     elif linearization == "temporal":
@@ -157,3 +302,20 @@ def _resolve_selection(selection):
         return SelectionSpatialAutoCorrelation
     else:
         return None
+
+
+def _resolve_chunk_dtype(chunk_dtype):
+    if chunk_dtype == "float32":
+        return np.dtype(np.float32)
+    elif chunk_dtype == "float64":
+        return np.dtype(np.float64)
+    else:
+        return None
+
+
+def _estimate_latency(
+    n_buckets, chunk_size: int, chunk_cost: float, bucket_cost: float, row_cost: float
+):
+    # the selection picks the rows of a chunk from all buckets at once, in a few batches (see
+    # Selection.select_batches_into_chunk), each of which processes the arrays of all buckets
+    return chunk_cost + n_buckets * bucket_cost + chunk_size * row_cost
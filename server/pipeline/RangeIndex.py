@@ -0,0 +1,105 @@
+import numpy as np
+
+# the sorted rows of a range index are grouped into blocks of this many rows
+BLOCK_SIZE = 1024
+
+
+class RangeIndex:
+    """Counts and retrieves the rows with a value of one column in a range, e.g., to steer a
+    selection into a brushed range, using sorted values and a Fenwick tree over blocks of rows."""
+
+    def __init__(self, values: np.ndarray, rows: np.ndarray, n_rows: int):
+        """Indexes the rows (row indeces into a linearization of n_rows rows) by their values."""
+        order = np.argsort(values, kind="stable")
+        self.values = np.asarray(values)[order]
+        self.rows = np.asarray(rows)[order]
+        self.is_remaining = np.ones(len(self.rows), dtype=bool)
+
+        n_blocks = -(-len(self.rows) // BLOCK_SIZE)
+        self.block_counts = np.full(n_blocks, BLOCK_SIZE, dtype=np.int64)
+        if n_blocks > 0:
+            self.block_counts[-1] = len(self.rows) - (n_blocks - 1) * BLOCK_SIZE
+
+        # node i (from 1) of the Fenwick tree holds the sum of the counts of the lowbit(i) blocks
+        # up to block i - 1
+        nodes = np.arange(n_blocks + 1)
+        sums = np.append(0, np.cumsum(self.block_counts))
+        self.block_tree = sums - sums[nodes - (nodes & -nodes)]
+
+        # position of each row of the linearization in the index (-1 for rows not in it)
+        dtype = np.int32 if len(self.rows) < 2**31 else np.int64
+        self.positions = np.full(n_rows, -1, dtype=dtype)
+        self.positions[self.rows] = np.arange(len(self.rows))
+
+    def __len__(self):
+        """Number of remaining rows."""
+        return self._count_blocks(len(self.block_counts))
+
+    def remove(self, rows: np.ndarray):
+        """Removes the given rows from the index (rows that are not in it are ignored)."""
+        positions = np.unique(self.positions[np.asarray(rows, dtype=np.int64)])
+        positions = positions[positions >= 0]
+        positions = positions[self.is_remaining[positions]]
+        self.is_remaining[positions] = False
+        blocks = positions // BLOCK_SIZE
+        np.subtract.at(self.block_counts, blocks, 1)
+
+        nodes = blocks + 1
+        while len(nodes) > 0:
+            np.subtract.at(self.block_tree, nodes, 1)
+            nodes = nodes + (nodes & -nodes)
+            nodes = nodes[nodes < len(self.block_tree)]
+
+    def count(self, min_value: float, max_value: float) -> int:
+        """Number of remaining rows with a value between min_value and max_value (inclusive)."""
+        first, stop = self._get_bounds(min_value, max_value)
+        if first >= stop:
+            return 0
+
+        first_block, last_block = first // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE
+        if first_block == last_block:
+            return int(np.count_nonzero(self.is_remaining[first:stop]))
+
+        # only the blocks at both ends of the range may be partially in it
+        first_rows = self.is_remaining[first : (first_block + 1) * BLOCK_SIZE]
+        last_rows = self.is_remaining[last_block * BLOCK_SIZE : stop]
+        return int(
+            np.count_nonzero(first_rows)
+            + self._count_blocks(last_block)
+            - self._count_blocks(first_block + 1)
+            + np.count_nonzero(last_rows)
+        )
+
+    def get_rows(self, min_value: float, max_value: float, limit: int = None):
+        """The remaining rows with a value between min_value and max_value (inclusive), ascending by
+        value, or only the first `limit` of them."""
+        first, stop = self._get_bounds(min_value, max_value)
+        if first >= stop:
+            return self.rows[:0]
+
+        first_block = first // BLOCK_SIZE
+        blocks = first_block + np.flatnonzero(
+            self.block_counts[first_block : (stop - 1) // BLOCK_SIZE + 1]
+        )
+        if limit is not None:
+            # the first block may count up to BLOCK_SIZE rows that are not in the range
+            counts = np.cumsum(self.block_counts[blocks])
+            blocks = blocks[: np.searchsorted(counts, limit + BLOCK_SIZE) + 1]
+
+        positions = (blocks[:, None] * BLOCK_SIZE + np.arange(BLOCK_SIZE)).ravel()
+        positions = positions[(positions >= first) & (positions < stop)]
+        positions = positions[self.is_remaining[positions]]
+        return self.rows[positions[:limit]]
+
+    def _count_blocks(self, n_blocks: int) -> int:
+        # number of remaining rows in the first n_blocks blocks
+        count = 0
+        while n_blocks > 0:
+            count += int(self.block_tree[n_blocks])
+            n_blocks -= n_blocks & -n_blocks
+        return count
+
+    def _get_bounds(self, min_value, max_value):
+        first = int(np.searchsorted(self.values, min_value, side="left"))
+        stop = int(np.searchsorted(self.values, max_value, side="right"))
+        return first, stop
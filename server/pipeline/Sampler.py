@@ -1,3 +1,6 @@
+import hashlib
+import pathlib
+import numpy as np
 import pandas as pd
 from . import *
 
@@ -9,8 +12,19 @@ class Sampler:
         linearization: LinearizationReader,
         subdivision: Subdivision,
         selection: Selection,
+        columns: list[int] = None,
+        streaming: bool = False,
+        block_size: int = 1_000_000,
+        persist_subdivisions: bool = False,
     ):
         self.data_set_name = data_set_name
+        # columns to load upfront from columnar linearization files
+        self.columns = columns
+        # in streaming mode, the linearization is subdivided in blocks of block_size rows
+        self.streaming = streaming
+        self.block_size = block_size
+        # subdivisions of all rows are cached, and with persist_subdivisions also stored on disk
+        self.persist_subdivisions = persist_subdivisions
         self.linearization_frame = linearization
         self.subdivision_frame = subdivision
         self.selection = selection
@@ -19,32 +33,140 @@ class Sampler:
 
     def pre_processing(self):
         print("preprocessing pipeline ...")
-        linearization = self.linearization_frame.read_linearization(self.data_set_name)
-        self.dataset_size = linearization.shape[0]
-        self.subdivision_frame.load_linearization(linearization)
-        bins = self.subdivision_frame.subdivide()
+        # the file is resolved once, so that all reads of this sampler use the same file
+        self.linearization_file = self.linearization_frame.get_linearization_file(
+            self.data_set_name
+        )
+        self.linearization = self.linearization_frame.read_linearization(
+            self.data_set_name, self.columns, self.linearization_file
+        )
+        self.dataset_size = self.linearization.shape[0]
+        self.linearization_key = (
+            self.data_set_name,
+            str(self.linearization_file),
+            self.linearization_file.stat().st_mtime_ns,
+        )
+        # bins of the subdivisions used by this sampler, by key
+        self.used_subdivisions = {}
+        # flags the rows that were sampled already, whichever subdivision they were sampled from
+        self.consumed = np.zeros(self.dataset_size, dtype=bool)
+        bins = self._subdivide(self.subdivision_frame)
         self.subdivision = bins
         self.update_selection(self.selection)
         print("Done with the pre-processing")
 
     def update_subdivision(self, subdivision: Subdivision):
         print("updating the subdivision")
-        # load the remaining data from the linearization into the new subdivision
-        subdivision.load_linearization(self.subdivision_frame.linearization)
-
         # generate the bins with the new subdivision over the remaining data
-        bins = subdivision.subdivide()
+        bins = self._subdivide(subdivision)
         self.subdivision = bins
         self.selection.load_subdivision(self.subdivision)
         print("Done updating the subdivision")
 
+    def _subdivide(self, subdivision: Subdivision) -> Buckets:
+        key = (*self.linearization_key, subdivision.get_key())
+        subdivision.load_linearization(self.linearization)
+
+        if key in self.used_subdivisions:
+            # switching back to a subdivision restores its bins, without the rows sampled since
+            bins = self.used_subdivisions[key]
+        elif key in SUBDIVISION_CACHE or not self.consumed.any():
+            # bins over all rows are shared between pipelines (and optionally stored on disk), so
+            # they are not modified, only the copy used by this sampler is
+            bins = SUBDIVISION_CACHE.get(
+                key, lambda: self._read_or_subdivide(subdivision)
+            ).copy()
+            bins.linearization = self.linearization
+        else:
+            # only the remaining rows are subdivided, so that sampled rows are not sampled again
+            # and switching the subdivision gets cheaper the further the progression is
+            bins = self._subdivide_rows(subdivision, np.flatnonzero(~self.consumed))
+
+        bins.consumed = self.consumed
+        bins.remove_consumed()
+        self.used_subdivisions[key] = bins
+        return bins
+
+    def _read_or_subdivide(self, subdivision: Subdivision) -> Buckets:
+        """Subdivides all rows of the linearization. With persist_subdivisions, the bins are
+        stored next to the linearization file and read from there as long as they are newer."""
+        file = self._get_subdivision_file(subdivision)
+        linearization_time = self.linearization_file.stat().st_mtime_ns
+        if self.persist_subdivisions and file.exists():
+            if file.stat().st_mtime_ns > linearization_time:
+                return Buckets.load(file, self.linearization)
+
+        bins = self._subdivide_rows(subdivision)
+        if self.persist_subdivisions:
+            try:
+                bins.save(file)
+            except OSError as error:
+                print(f"could not store the subdivision in {file.name}: {error}")
+        return bins
+
+    def _get_subdivision_file(self, subdivision: Subdivision) -> pathlib.Path:
+        digest = hashlib.md5(subdivision.get_key().encode()).hexdigest()[:12]
+        name = self.linearization_file.name.split(".")[0]
+        return self.linearization_file.with_name(f"{name}.{digest}.buckets.npz")
+
+    def _subdivide_rows(self, subdivision: Subdivision, rows=None) -> Buckets:
+        # subdivides the given rows (all by default) of the linearization
+        if rows is not None and len(rows) == 0:
+            # everything was sampled already, so there is nothing left to subdivide
+            return Buckets(self.linearization, np.zeros(1, dtype=int))
+
+        # the subdivision sees a view on the given rows, from which it only loads the columns that
+        # it uses
+        linearization = self.linearization
+        if rows is not None:
+            linearization = _get_rows_view(linearization, rows)
+        subdivision.load_linearization(linearization)
+
+        # in streaming mode, the bucket boundaries are computed in a single pass over blocks of the
+        # linearization and the buckets are views on it, so that for memory-mapped linearizations
+        # no copy of the rows is kept in memory
+        if self.streaming and subdivision.supports_streaming:
+            blocks = self.linearization_frame.iter_linearization(
+                self.data_set_name,
+                self.block_size,
+                subdivision.stream_columns,
+                self.linearization_file,
+            )
+            if rows is not None:
+                blocks = _skip_consumed(blocks, self.consumed)
+            bins = subdivision.split(subdivision.subdivide_stream(blocks))
+        else:
+            bins = subdivision.subdivide()
+
+        # the bins of a subset of the rows index into the subset, so map them back to the full
+        # linearization
+        if rows is not None:
+            bins.rebase(self.linearization, rows)
+        return bins
+
     def update_selection(self, selection: Selection):
+        # sorted selections remove rows from a copy of the bins, so drop these rows here as well
+        self.subdivision.remove_consumed()
         selection.load_subdivision(self.subdivision)
         self.selection = selection
 
-    def sample(self, selection: Selection, chunk_size: int = -1):
+    def sample(self, selection: Selection, chunk_size: int = -1, out=None):
         # return the next chunk of data points
-        return selection.next_chunk(chunk_size)
+        return selection.next_chunk(chunk_size, out)
 
     def get_dataset_size(self):
         return self.dataset_size
+
+
+def _get_rows_view(linearization, rows: np.ndarray) -> LazyLinearization:
+    if isinstance(linearization, LazyLinearization):
+        return linearization[rows]
+    return LazyLinearization(ArrayColumnSource(linearization), rows)
+
+
+def _skip_consumed(blocks, consumed: np.ndarray):
+    # removes the consumed rows from blocks of consecutive rows of the linearization
+    offset = 0
+    for block in blocks:
+        yield block[~consumed[offset : offset + len(block)]]
+        offset += len(block)
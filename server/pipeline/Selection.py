@@ -2,13 +2,21 @@ from abc import ABC, abstractmethod
 from typing import List
 import time
 import random
-import itertools
 import numpy as np
 from sklearn.utils.random import sample_without_replacement
 
+from .Buckets import Buckets, concatenated_ranges
+from .RangeIndex import RangeIndex
+
 
 class Selection(ABC):
     chunk_counter = 0  # used for seeding randomness
+    # whether the selection depends on the order of the items in the buckets. If it does not,
+    # selected items are removed from the buckets by swapping in the last items of the bucket.
+    keeps_order = True
+    # whether chunks are selected from all buckets at once (by select_batch), or bucket by bucket
+    # (by select_elements). Both select the same number of items from each bucket.
+    batched = True
 
     def __init__(self, random_state=0) -> None:
         super().__init__()
@@ -16,6 +24,10 @@ class Selection(ABC):
             {}
         )  # a dict mapping a steered dimension to a min-max filter.
         self.random_state = random_state  # used for seeding randomness
+        self.rng = np.random.default_rng(random_state)
+        # range indeces over the remaining items of the subdivision, by steered dimension. They are
+        # kept when steering is cleared, so that steering the same dimension again is fast.
+        self.steering_indeces = {}
 
     def steer(self, dimension: int = None, min_value: int = 0, max_value: int = 1):
         steering_filter = {"min_value": float(min_value), "max_value": float(max_value)}
@@ -24,97 +36,137 @@ class Selection(ABC):
     def clear_steering(self):
         self.steering_filters = {}
 
-    def load_subdivision(self, subdivision):
+    def load_subdivision(self, subdivision: Buckets):
         self.subdivision = subdivision
+        self.steering_indeces = {}
 
-    def _load_subdivision_sorted(self, subdivision, attribute: int):
+    def _load_subdivision_sorted(self, subdivision: Buckets, attribute: int):
         """Auxilary function for subdivsions that select elements based on some order in the bucket.
-        Rather than sorting the buckets before each selection, this function sorts the data once.
-        This is done for performance reasons."""
-        _subdivision = {}
-
-        bucket_keys = list(subdivision.copy().keys())
-        for bucket_key in bucket_keys:
-            bucket = np.array(subdivision[bucket_key])
-            _subdivision[bucket_key] = bucket[bucket[:, attribute].argsort(axis=0)]
+        Rather than sorting the buckets before each selection, the selection works on a copy of the
+        index of the buckets sorted by the attribute, not the rows themselves. The sorted copy is
+        kept by the subdivision, so that switching between selections by the same attribute does
+        not sort the buckets again."""
+        self.subdivision = subdivision.sorted_by(attribute)
+        self.steering_indeces = {}
 
-        self.subdivision = _subdivision
-
-    def is_steered_subspace_empty(self):
-        # FIXME: this is a sinful hack, compacting all items into a numpy array for "fast" checking
-        all_items = np.array(
-            list(itertools.chain.from_iterable(list(self.subdivision.values())))
-        )
-        check = np.full(
-            len(all_items), True
-        )  # boolean index indicating items matching steering
+    def _match_steering(self, indeces: np.ndarray) -> np.ndarray:
+        # boolean index indicating which of the rows with the given indeces match the steering
+        check = np.full(len(indeces), True)
 
         for dim in self.steering_filters:
             min_value = self.steering_filters[dim]["min_value"]
             max_value = self.steering_filters[dim]["max_value"]
-            dim = int(dim)
-            check = (
-                (all_items[:, dim] >= min_value)
-                & (all_items[:, dim] <= max_value)
-                & check
+            values = np.asarray(self.subdivision.linearization[indeces, int(dim)])
+            check = (values >= min_value) & (values <= max_value) & check
+
+        return check
+
+    def _get_steering_index(self, dimension) -> RangeIndex:
+        # built on first use, over the items that remain in the subdivision at that time
+        dimension = int(dimension)
+        if dimension not in self.steering_indeces:
+            indeces, _, _ = self.subdivision.get_remaining()
+            linearization = self.subdivision.linearization
+            values = np.asarray(linearization[indeces, dimension])
+            self.steering_indeces[dimension] = RangeIndex(
+                values, indeces, len(linearization)
             )
+        return self.steering_indeces[dimension]
+
+    def _remove_from_indeces(self, indeces: np.ndarray):
+        # called with the row indeces of the items removed from the subdivision
+        for steering_index in self.steering_indeces.values():
+            steering_index.remove(indeces)
+
+    def get_steered_indeces(self, limit: int = None) -> np.ndarray:
+        """Row indeces of the remaining items that match the steering, or of the first `limit` of
+        them. They are retrieved from the range index of the steered dimension with the fewest
+        matches, and filtered by the other steered dimensions."""
+        filters = [
+            (self._get_steering_index(dim), steering_filter)
+            for dim, steering_filter in self.steering_filters.items()
+        ]
+        counts = [
+            steering_index.count(f["min_value"], f["max_value"])
+            for steering_index, f in filters
+        ]
+        steering_index, f = filters[int(np.argmin(counts))]
+
+        if len(filters) == 1:
+            return steering_index.get_rows(f["min_value"], f["max_value"], limit)
+
+        indeces = steering_index.get_rows(f["min_value"], f["max_value"])
+        return indeces[self._match_steering(indeces)][:limit]
 
-        is_empty = check.sum() == 0
-        return is_empty
+    def is_steered_subspace_empty(self):
+        return len(self.get_steered_indeces(1)) == 0
 
     def get_indeces_matching_steering_in_bucket(self, bucket_index: int) -> List[int]:
-        bucket = np.array(self.subdivision[bucket_index])
-        check = np.full(
-            len(bucket), True
-        )  # boolean index indiciating items matching steering
-
-        for dim in self.steering_filters:
-            min_value = self.steering_filters[dim]["min_value"]
-            max_value = self.steering_filters[dim]["max_value"]
-            values = bucket[:, int(dim)]
-            check = (values >= min_value) & (values <= max_value) & check
+        check = self._match_steering(self.subdivision.get_indeces(bucket_index))
 
         # use the 0 index below, because nonzero() gets indeces, but returns a tuple
         indeces = check.nonzero()[0].tolist()
         return indeces
 
-    def create_steered_chunk(self, chunk_size: int) -> np.ndarray:
+    def create_steered_chunk(self, chunk: np.ndarray) -> np.ndarray:
         # proof-of-concept: steering means that we can prioritize data along ONE dimension in the
-        # data. Thus, we go through all subdivision and collect items that match the steering
-        # condition, until we have `chunk_size` items
-        steered_chunk = []
-        buckets = self.subdivision.copy()
-
-        matches_query_tuples = []
-
-        for b in buckets:
-            matching_indeces = self.get_indeces_matching_steering_in_bucket(b)
-
-            for matching_index in matching_indeces:
-                matches_query_tuples += [(b, matching_index)]
-
-        actual_chunk_size = min(chunk_size, len(matches_query_tuples))
+        # data. Thus, we collect items that match the steering condition, until the chunk is full
+        # (or there are no more matches). The range index of the steered dimension returns the
+        # matches ordered by their value in that dimension.
+        indeces = self.get_steered_indeces(len(chunk))
+        steered_chunk = chunk[: len(indeces)]
+        steered_chunk[:] = np.asarray(self.subdivision.linearization[indeces])
+
+        self.subdivision.remove_rows(indeces, self.keeps_order)
+        self._remove_from_indeces(indeces)
+        return steered_chunk
+
+    def _get_quotas(self, n_items: int) -> np.ndarray:
+        """The number of items to select from each bucket, distributed in rounds like in
+        select_into_chunk: evenly over all buckets that are not empty (but at least 1 per bucket),
+        in random order, until n_items are distributed."""
+        sizes = self.subdivision.get_sizes()
+        quotas = np.zeros(len(sizes), dtype=np.int64)
+        while n_items > 0:
+            buckets = self.rng.permutation(np.flatnonzero(quotas < sizes))
+            n_per_bucket = max(n_items // len(buckets), 1)
+            counts = np.minimum(sizes[buckets] - quotas[buckets], n_per_bucket)
+
+            # with 1 item per bucket, the buckets in the front of the order may be enough
+            n_buckets = np.searchsorted(np.cumsum(counts), n_items) + 1
+            quotas[buckets[:n_buckets]] += counts[:n_buckets]
+            n_items -= int(counts[:n_buckets].sum())
+        return quotas
+
+    def select_batches_into_chunk(self, chunk: np.ndarray, chunk_size: int):
+        pos_in_chunk = 0
+        while pos_in_chunk < chunk_size:
+            quotas = self._get_quotas(chunk_size - pos_in_chunk)
+            buckets = self.rng.permutation(np.flatnonzero(quotas))
+            item_buckets, positions = self.select_batch(buckets, quotas[buckets])
 
-        # add the number of matching items, but at most chunk_size items to the steered chunk
-        for i in range(0, actual_chunk_size):
-            b, matching_index = matches_query_tuples[i]
-            steered_chunk += [buckets[b][matching_index]]
-            buckets[b][matching_index] = None  # set flag for deletion
+            # selections may pick fewer items than requested, stop if they cannot pick any
+            if len(positions) == 0:
+                return chunk[:pos_in_chunk]
 
-        for b in buckets:
-            self.subdivision[b] = [item for item in buckets[b] if item is not None]
+            indeces = self.subdivision.get_item_indeces(item_buckets, positions)
+            rows = np.asarray(self.subdivision.linearization[indeces])
+            chunk[pos_in_chunk : pos_in_chunk + len(indeces)] = rows
+            pos_in_chunk += len(indeces)
 
-            # delete the entire bucket if it's empty
-            if len(self.subdivision[b]) == 0:
-                del self.subdivision[b]
+            self.subdivision.remove_items(item_buckets, positions, self.keeps_order)
+            self._remove_from_indeces(indeces)
 
-        steered_chunk = [c for c in steered_chunk if c is not None]
-        return np.array(steered_chunk)
+        return chunk
 
     def select_into_chunk(self, chunk: np.ndarray, chunk_size: int) -> np.ndarray:
+        if self.batched:
+            return self.select_batches_into_chunk(chunk, chunk_size)
+
         pos_in_chunk = 0
         while pos_in_chunk < chunk_size:
-            bucket_keys = list(self.subdivision.copy().keys())
+            removed_indeces = []
+            bucket_keys = self.subdivision.get_non_empty().tolist()
 
             # prevent ordering bias when chunk_size is bigger than number of bins
             random.shuffle(bucket_keys)
@@ -130,34 +182,40 @@ class Selection(ABC):
 
                 # ensure to only select at most as many items as there are in the bucket
                 n_elements = min(
-                    len(self.subdivision[bucket_key]), n_elements_per_bucket
+                    self.subdivision.get_size(bucket_key), n_elements_per_bucket
                 )
 
                 next_indeces = self.select_elements(
                     n_elements, chunk, pos_in_chunk, bucket_key
                 )
-                next_indeces.sort(reverse=True)
                 pos_in_chunk += len(next_indeces)
 
-                self.subdivision[bucket_key] = np.delete(
-                    self.subdivision[bucket_key], next_indeces, axis=0
+                # buckets that become empty are skipped from the next round on
+                removed_indeces.append(
+                    self.subdivision.remove(bucket_key, next_indeces, self.keeps_order)
                 )
 
-                if len(self.subdivision[bucket_key]) == 0:
-                    del self.subdivision[bucket_key]
+            # each bucket is visited once per round, so the indeces are updated after each round
+            if len(removed_indeces) > 0:
+                self._remove_from_indeces(np.concatenate(removed_indeces))
 
         return chunk
 
-    def next_chunk(self, chunk_size: int = -1) -> np.ndarray:
+    def next_chunk(self, chunk_size: int = -1, out: np.ndarray = None) -> np.ndarray:
+        """Selects the next chunk_size rows (by default as many as there are buckets). The chunk
+        has the dtype of the linearization, unless it is written into the first rows of `out`, e.g.,
+        to reuse a buffer for all chunks. Chunks are shorter at the end of the progression, when
+        there are fewer rows left."""
         # If the first subdivision is empty, None is returned
         if len(self.subdivision) == 0:
             return None
 
-        first_key = next(iter(self.subdivision))  # iterator over the subdivision bins
-        data_dimension = len(self.subdivision[first_key][0])
-
         chunk_size = chunk_size if chunk_size > -1 else len(self.subdivision)
-        chunk = np.full((chunk_size, data_dimension), None)
+        chunk_size = min(chunk_size, self.subdivision.n_rows)
+        if out is None:
+            linearization = self.subdivision.linearization
+            out = np.empty((chunk_size, linearization.shape[1]), linearization.dtype)
+        chunk = out[:chunk_size]
 
         # this is a simple extension for enabling steering: check if steering parameters are set,
         # if that steering subspace is not empty and then sample from there, otherwise use the
@@ -165,12 +223,11 @@ class Selection(ABC):
         if len(self.steering_filters.keys()) > 0:
             if not self.is_steered_subspace_empty():
                 print("using steering ...")
-                # use number of buckets as chunk size
-                chunk = self.create_steered_chunk(chunk_size)
-                return chunk
+                return self.create_steered_chunk(chunk)
 
         # seed any randomness in the selections
         random.seed(self.random_state + self.chunk_counter)
+        self.rng = np.random.default_rng(self.random_state + self.chunk_counter)
         self.chunk_counter += 1
 
         return self.select_into_chunk(chunk, chunk_size)
@@ -183,29 +240,45 @@ class Selection(ABC):
     ) -> list[int]:
         pass
 
+    # Selects n_elements[i] items from bucket buckets[i] for all i at once, returns the bucket
+    # number and the position in the bucket of each selected item
+    @abstractmethod
+    def select_batch(self, buckets: np.ndarray, n_elements: np.ndarray):
+        pass
+
 
 class SelectionRandom(Selection):
+    keeps_order = False
+
     def select_elements(self, n_elements, chunk, pos_in_chunk, bucket_key):
-        subdivision_size = len(self.subdivision[bucket_key])
+        subdivision_size = self.subdivision.get_size(bucket_key)
         indeces = sample_without_replacement(
             n_population=subdivision_size,
             n_samples=n_elements,
             random_state=random.randint(0, subdivision_size - 1),
         )
 
-        bucket = self.subdivision[bucket_key]
-        chunk[pos_in_chunk : pos_in_chunk + n_elements] = bucket[indeces]
+        rows = self.subdivision.get_rows(bucket_key, indeces)
+        chunk[pos_in_chunk : pos_in_chunk + n_elements] = rows
         return list(indeces)
 
+    def select_batch(self, buckets, n_elements):
+        sizes = self.subdivision.get_sizes()[buckets]
+        groups, positions = _sample_without_replacement(sizes, n_elements, self.rng)
+        return buckets[groups], positions
+
 
 class SelectionFirst(Selection):
     def select_elements(self, n_elements, chunk, pos_in_chunk, bucket_key):
         indeces = range(0, n_elements)
 
-        bucket = self.subdivision[bucket_key]
-        chunk[pos_in_chunk : pos_in_chunk + n_elements] = bucket[indeces]
+        rows = self.subdivision.get_rows(bucket_key, indeces)
+        chunk[pos_in_chunk : pos_in_chunk + n_elements] = rows
         return list(indeces)
 
+    def select_batch(self, buckets, n_elements):
+        return np.repeat(buckets, n_elements), concatenated_ranges(n_elements)
+
 
 class SelectionMinimum(Selection):
     attribute = 0
@@ -220,10 +293,13 @@ class SelectionMinimum(Selection):
     def select_elements(self, n_elements, chunk, pos_in_chunk, bucket_key):
         n_min_indeces = np.arange(0, n_elements)
 
-        bucket = self.subdivision[bucket_key]
-        chunk[pos_in_chunk : pos_in_chunk + n_elements] = bucket[n_min_indeces]
+        rows = self.subdivision.get_rows(bucket_key, n_min_indeces)
+        chunk[pos_in_chunk : pos_in_chunk + n_elements] = rows
         return list(n_min_indeces)
 
+    def select_batch(self, buckets, n_elements):
+        return np.repeat(buckets, n_elements), concatenated_ranges(n_elements)
+
 
 class SelectionMaximum(Selection):
     attribute = 0
@@ -236,13 +312,18 @@ class SelectionMaximum(Selection):
         super()._load_subdivision_sorted(subdivision, self.attribute)
 
     def select_elements(self, n_elements, chunk, pos_in_chunk, bucket_key):
-        size = len(self.subdivision[bucket_key])
+        size = self.subdivision.get_size(bucket_key)
         n_max_indeces = np.arange(size - n_elements, size)
 
-        bucket = self.subdivision[bucket_key]
-        chunk[pos_in_chunk : pos_in_chunk + n_elements] = bucket[n_max_indeces]
+        rows = self.subdivision.get_rows(bucket_key, n_max_indeces)
+        chunk[pos_in_chunk : pos_in_chunk + n_elements] = rows
         return list(n_max_indeces)
 
+    def select_batch(self, buckets, n_elements):
+        sizes = self.subdivision.get_sizes()[buckets]
+        firsts = np.repeat(sizes - n_elements, n_elements)
+        return np.repeat(buckets, n_elements), firsts + concatenated_ranges(n_elements)
+
 
 class SelectionMedian(Selection):
     attribute = 0
@@ -256,7 +337,8 @@ class SelectionMedian(Selection):
 
     def select_elements(self, n_elements, chunk, pos_in_chunk, bucket_key):
         # the central element in sorted_indeces is the index of the "median" in the bucket
-        center_pos = len(self.subdivision[bucket_key]) // 2
+        size = self.subdivision.get_size(bucket_key)
+        center_pos = size // 2
 
         # padding around the center position. If even number of elements is returned, right end
         # of the window is bigger than left end by 1
@@ -266,55 +348,141 @@ class SelectionMedian(Selection):
         )
 
         # as a heuristic, get n/2 elements before and after that element as "medians"
-        if len(self.subdivision[bucket_key]) <= n_elements:
+        if size <= n_elements:
             # if less than n_elements in bucket, just return all elements in bucket
-            n_median_indeces = np.arange(0, len(self.subdivision[bucket_key]))
+            n_median_indeces = np.arange(0, size)
         else:
             # otherwise us a window centered around center_pos
             n_median_indeces = np.arange(
                 center_pos - pad_left, center_pos + pad_right + 1
             )
 
-        bucket = self.subdivision[bucket_key]
-        chunk[pos_in_chunk : pos_in_chunk + n_elements] = bucket[n_median_indeces]
+        rows = self.subdivision.get_rows(bucket_key, n_median_indeces)
+        chunk[pos_in_chunk : pos_in_chunk + n_elements] = rows
 
         return list(n_median_indeces)
 
+    def select_batch(self, buckets, n_elements):
+        # the same windows around the center positions as in select_elements
+        sizes = self.subdivision.get_sizes()[buckets]
+        firsts = np.where(sizes <= n_elements, 0, sizes // 2 - (n_elements - 1) // 2)
+        positions = np.repeat(firsts, n_elements) + concatenated_ranges(n_elements)
+        return np.repeat(buckets, n_elements), positions
+
 
 class SelectionSpatialAutoCorrelation(Selection):
+    keeps_order = False
     value_h_index = 0
     lag_h_index = 0
+    # the items of the subdivision grouped by quadrant: bucket 4 * i + q holds the items of bucket i
+    # in quadrant q (HH, HL, LH and LL). Items that are in none of the quadrants are left out.
+    quadrants = None
 
     def __init__(self, value_h_index: int, lag_h_index: int) -> None:
         super().__init__()
         self.value_h_index = value_h_index
         self.lag_h_index = lag_h_index
 
+    def load_subdivision(self, subdivision):
+        super().load_subdivision(subdivision)
+        indeces, _, _ = subdivision.get_remaining()
+        value_h = np.asarray(subdivision.linearization[indeces, self.value_h_index])
+        lag_h = np.asarray(subdivision.linearization[indeces, self.lag_h_index])
+
+        # the quadrants HH, HL, LH and LL as 0 to 3, and -1 for items that are in none of them
+        quadrants = np.select(
+            [
+                (value_h == 1) & (lag_h == 1),
+                (value_h == 1) & (lag_h == 0),
+                (value_h == 0) & (lag_h == 1),
+                (value_h == 0) & (lag_h == 0),
+            ],
+            [0, 1, 2, 3],
+            -1,
+        )
+        self.quadrants = subdivision.split_by(quadrants, 4)
+
+    def _remove_from_indeces(self, indeces):
+        super()._remove_from_indeces(indeces)
+        # the order of the items in a quadrant does not matter, so they are swap-removed
+        self.quadrants.remove_rows(indeces, keep_order=False)
+
+    def _select_from_quadrants(self, buckets: np.ndarray, n_elements: np.ndarray):
+        """Row indeces of the items to select from the buckets: up to 25% of n_elements (but at
+        least 1) from each quadrant, in random order, and at most n_elements per bucket. Returns
+        them ordered by bucket, along with the position of their bucket in buckets."""
+        n_selection = np.repeat(np.maximum(n_elements // 4, 1), 4)
+        groups = (4 * buckets[:, None] + np.arange(4)).ravel()
+        counts = np.minimum(n_selection, self.quadrants.get_sizes()[groups])
+        indeces = self.quadrants.get_item_indeces(
+            np.repeat(groups, counts), concatenated_ranges(counts)
+        )
+        owners = np.repeat(np.repeat(np.arange(len(buckets)), 4), counts)
+
+        keys = self.rng.random(len(indeces))
+        order = np.lexsort((keys, owners))
+        order = order[_get_ranks(owners[order]) < n_elements[owners[order]]]
+        return indeces[order], owners[order]
+
     def select_elements(
         self, n_elements: int, chunk: np.ndarray, pos_in_chunk: int, bucket_key: int
     ) -> list[int]:
-        bucket = self.subdivision[bucket_key]
-        indeces = []
-
         # we should select up to n_elements. find out how many of those should be HH, HL, LH, and LL
-        for value_is_H in [True, False]:
-            for lag_is_H in [True, False]:
-                # find all candidates in this quadrant
-                bucket_value_h = bucket[:, self.value_h_index] == value_is_H
-                bucket_lag_h = bucket[:, self.lag_h_index] == lag_is_H
-
-                # select up to 25% points in this quadrant, but at least 1
-                n_selection = max(n_elements // 4, 1)
-                candidate_indeces = list(
-                    (bucket_value_h & bucket_lag_h).nonzero()[0][:n_selection]
-                )
-                indeces += candidate_indeces
-
-        random.shuffle(indeces)
+        indeces, _ = self._select_from_quadrants(
+            np.array([bucket_key]), np.array([n_elements])
+        )
+        _, positions, _ = self.subdivision.locate_rows(indeces)
+
+        rows = np.asarray(self.subdivision.linearization[indeces])
+        chunk[pos_in_chunk : pos_in_chunk + len(indeces)] = rows
+        return list(positions)
+
+    def select_batch(self, buckets, n_elements):
+        indeces, _ = self._select_from_quadrants(buckets, n_elements)
+        item_buckets, positions, _ = self.subdivision.locate_rows(indeces)
+        return item_buckets, positions
+
+
+def _get_ranks(keys: np.ndarray) -> np.ndarray:
+    # the position of each item among the items with the same key, for keys sorted ascending
+    first_items = np.flatnonzero(np.diff(keys, prepend=-1))
+    return concatenated_ranges(np.diff(np.append(first_items, len(keys))))
+
+
+def _sample_without_replacement(sizes: np.ndarray, counts: np.ndarray, rng):
+    """Draws counts[i] distinct positions from range(sizes[i]) for all i at once, returns i and the
+    position of each drawn item."""
+    groups = np.arange(len(sizes))
+
+    # where at least half of the positions are drawn, rank all of them by a random key
+    is_dense = 2 * counts >= sizes
+    dense_groups = np.repeat(groups[is_dense], sizes[is_dense])
+    dense_positions = concatenated_ranges(sizes[is_dense])
+    order = np.lexsort((rng.random(len(dense_groups)), dense_groups))
+    is_drawn = _get_ranks(dense_groups[order]) < counts[dense_groups[order]]
+    dense_drawn = order[is_drawn]
+
+    # elsewhere, draw positions with replacement, and draw again for duplicates
+    drawn_groups = np.zeros(0, dtype=np.int64)
+    drawn_positions = np.zeros(0, dtype=np.int64)
+    missing = np.where(is_dense, 0, counts)
+    while missing.sum() > 0:
+        new_groups = np.repeat(groups, missing)
+        new_positions = (rng.random(len(new_groups)) * sizes[new_groups]).astype(
+            np.int64
+        )
+        drawn_groups = np.concatenate([drawn_groups, new_groups])
+        drawn_positions = np.concatenate([drawn_positions, new_positions])
 
-        # make sure that at most n_elements are selected. This can be useful when n_elements < 4,
-        # since we are selecting at least 1 element per quadrant.
-        indeces = indeces[:n_elements]
-        chunk[pos_in_chunk : pos_in_chunk + len(indeces)] = bucket[indeces]
+        _, unique = np.unique(
+            drawn_groups * (sizes.max() + 1) + drawn_positions, return_index=True
+        )
+        drawn_groups, drawn_positions = drawn_groups[unique], drawn_positions[unique]
+        missing = np.where(
+            is_dense, 0, counts - np.bincount(drawn_groups, minlength=len(sizes))
+        )
 
-        return indeces
+    return (
+        np.concatenate([dense_groups[dense_drawn], drawn_groups]),
+        np.concatenate([dense_positions[dense_drawn], drawn_positions]),
+    )
@@ -1,112 +1,152 @@
 from abc import ABC, abstractmethod
+import json
 import numpy as np
 from sklearn.utils.random import sample_without_replacement
 
+from .Buckets import Buckets
+
 
 class Subdivision(ABC):
+    # whether the subdivision implements subdivide_stream(blocks), which computes the bucket
+    # boundaries in a single pass over blocks of rows (restricted to stream_columns) of the
+    # linearization, without keeping copies of the rows, and returns the edges, such that bucket i
+    # contains the rows edges[i] to edges[i + 1]
+    supports_streaming = False
+    # columns that subdivide_stream() needs to see in the blocks of the linearization
+    stream_columns: list[int] = [0]
+
     def load_linearization(self, linearization):
         self.linearization = linearization
 
     @abstractmethod
-    def subdivide(self):
+    def subdivide(self) -> Buckets:
         pass
 
+    def get_key(self) -> str:
+        """Identifies the subdivision by its type and parameters, which (for a given linearization)
+        determine its buckets."""
+        params = {k: v for k, v in vars(self).items() if k != "linearization"}
+        params = json.dumps(
+            params, sort_keys=True, default=lambda v: np.asarray(v).tolist()
+        )
+        return f"{type(self).__name__}{params}"
+
+    def split(self, edges: np.ndarray) -> Buckets:
+        """Turns bucket boundaries into buckets, which reference the rows of the linearization by
+        index (i.e., for memory-mapped linearizations, no row is loaded into memory here). Empty
+        buckets are omitted."""
+        return Buckets(self.linearization, edges)
+
 
 class SubdivisionCardinality(Subdivision):
     sampling_rate = 0
+    supports_streaming = True
 
     def __init__(self, chunk_size: int):
         self.chunk_size = chunk_size
 
     def subdivide(self):
-        bucket_size = int(len(self.linearization) / self.chunk_size)
-        no_of_points = len(self.linearization)
-        subdivision = {}
-        division_number = 0
-        for i in range(0, no_of_points, bucket_size):
-            next_division = self.linearization[i : i + bucket_size]
-            subdivision[division_number] = next_division
-            division_number += 1
-        return subdivision
+        return self.split(self.get_edges(len(self.linearization)))
+
+    def subdivide_stream(self, blocks):
+        # the number of rows is known without reading the blocks
+        return self.get_edges(len(self.linearization))
+
+    def get_edges(self, no_of_points: int) -> np.ndarray:
+        # at least one item per bucket, e.g., for the few rows that remain late in a progression
+        bucket_size = max(int(no_of_points / self.chunk_size), 1)
+        return np.append(np.arange(0, no_of_points, bucket_size), no_of_points)
 
 
 class SubdivisionRandom(Subdivision):
+    supports_streaming = True
+
     def __init__(self, n_bins: int) -> None:
         super().__init__()
         self.n_bins = n_bins
 
     def subdivide(self):
-        subdivision = {}
+        return self.split(self.get_edges(len(self.linearization)))
 
-        # generate n_bins indeces to split up the linearized data
+    def subdivide_stream(self, blocks):
+        return self.get_edges(len(self.linearization))
+
+    def get_edges(self, no_of_points: int) -> np.ndarray:
+        # generate n_bins indeces to split up the linearized data, each bin ends at one of them
         bin_edges = sample_without_replacement(
-            n_population=len(self.linearization), n_samples=self.n_bins, random_state=0
+            n_population=no_of_points, n_samples=self.n_bins, random_state=0
         )
         bin_edges = bin_edges[np.argsort(bin_edges)]
-
-        for i in range(self.n_bins):
-            if i == 0:
-                first = 0
-                last = bin_edges[i]
-                subdivision[i] = self.linearization[first : last + 1]
-            elif i == self.n_bins - 1:
-                first = bin_edges[i - 1]
-                last = -1
-                subdivision[i] = self.linearization[first + 1 :]
-            else:
-                first = bin_edges[i - 1]
-                last = bin_edges[i]
-                subdivision[i] = self.linearization[first + 1 : last + 1]
-
-        # throw out empty bins (can happen when two edges are right after each one another)
-        for i in range(self.n_bins):
-            if len(subdivision[i]) == 0:
-                del subdivision[i]
-
-        return subdivision
+        return np.concatenate([[0], bin_edges[: self.n_bins - 1] + 1, [no_of_points]])
 
 
 class SubdivisionCohesion(Subdivision):
+    supports_streaming = True
+
     def __init__(self, attributes: list[int], n_bins: int) -> None:
         super().__init__()
         self.attributes = attributes
+        self.stream_columns = attributes
         self.n_bins = n_bins
 
     def subdivide(self):
-        subdivision = {}
-
         # find the n_bins biggest jumps in the data along the attribute column
-        X = self.linearization[:, self.attributes].astype(np.float64)
-
-        # creates a copy of X where rows are shifted by 1 for faster subtraction
-        X_ = np.empty_like(X)
-        X_[:-1] = X[1:]
-        X_[-1] = X[0]
-
-        X_jump = np.linalg.norm(X - X_, axis=1)  # computes euclidean distance
-        biggest_jump_indeces = np.argsort(X_jump)[
-            -self.n_bins - 1 :
-        ]  # one larger than n_bins
-
-        for i in range(self.n_bins):
-            if i == 0:
-                first = 0
-                last = biggest_jump_indeces[i]
-                subdivision[i] = self.linearization[first : last + 1]
-            elif i == self.n_bins - 1:
-                first = biggest_jump_indeces[i - 1]
-                last = -1
-                subdivision[i] = self.linearization[first + 1 :]
+        X = self.linearization[:, self.attributes]
+        return self.split(self.subdivide_stream([X]))
+
+    def subdivide_stream(self, blocks):
+        # cut the linearization after the n_bins - 1 biggest jumps along the attribute columns,
+        # keeping only the biggest jumps seen so far
+        n_cuts = self.n_bins - 1
+        top_jumps = np.empty(0)
+        top_positions = np.empty(0, dtype=np.int64)
+
+        first_row = None
+        previous_row = None
+        offset = 0
+
+        for block in blocks:
+            X = np.asarray(block, dtype=np.float64)
+            if len(X) == 0:
+                continue
+
+            if first_row is None:
+                first_row = X[0]
+                X_ = X
+                positions = np.arange(0, len(X) - 1)
             else:
-                first = biggest_jump_indeces[i - 1]
-                last = biggest_jump_indeces[i]
-                subdivision[i] = self.linearization[first + 1 : last + 1]
+                X_ = np.vstack([previous_row, X])
+                positions = np.arange(offset - 1, offset + len(X) - 1)
+
+            # jump i is the euclidean distance between item i and item i+1
+            jumps = np.linalg.norm(X_[1:] - X_[:-1], axis=1)
+            top_jumps, top_positions = _keep_biggest(
+                np.concatenate([top_jumps, jumps]),
+                np.concatenate([top_positions, positions]),
+                n_cuts,
+            )
+
+            previous_row = X[-1]
+            offset += len(X)
+
+        if first_row is None:
+            return np.array([0, 0])
+
+        # like a ring, the last item is compared to the first one
+        last_jump = np.linalg.norm(previous_row - first_row, keepdims=True)
+        top_jumps, top_positions = _keep_biggest(
+            np.concatenate([top_jumps, last_jump]),
+            np.concatenate([top_positions, [offset - 1]]),
+            n_cuts,
+        )
+
+        return np.unique(np.concatenate([[0], top_positions + 1, [offset]]))
+
 
-        # throw out empty bins (can happen when two jumps are right after each one another)
-        for i in range(self.n_bins):
-            if len(subdivision[i]) == 0:
-                del subdivision[i]
-        return subdivision
+def _keep_biggest(jumps: np.ndarray, positions: np.ndarray, n: int):
+    # order by descending jump and (for deterministic ties) ascending position
+    order = np.lexsort((positions, -jumps))[: max(n, 0)]
+    return jumps[order], positions[order]
 
 
 class SubdivisionCoverage(Subdivision):
@@ -114,55 +154,46 @@ class SubdivisionCoverage(Subdivision):
     low_quantile: float = 0.05
     high_quantile: float = 0.95
 
-    def __init__(self, attribute: int, low_quantile: float = 0, high_quantile: float = 1):
+    def __init__(
+        self, attribute: int, low_quantile: float = 0, high_quantile: float = 1
+    ):
         super().__init__()
         self.attribute = attribute
         self.low_quantile = low_quantile
         self.high_quantile = high_quantile
 
     def subdivide(self):
-        subdivision = {}
-
         X = self.linearization[:, self.attribute]
+        edges = self.get_edges(np.asarray(X))
+
+        # bin i contains the items from edge i - 1 up to edge i, and the last bin the items "after"
+        # the last edge (the first edge is always 0, so bin 0 is empty and omitted)
+        return self.split(np.concatenate([[0], edges, [len(X)]]))
 
+    def get_edges(self, X: np.ndarray) -> np.ndarray:
+        """Divides the data into bins that contain both a "low" and a "high" value: scanning the
+        data, a bin edge is placed every time both were seen since the previous edge."""
         # find all instances outside the 0.05 quantiles
-        low_value = np.quantile(X, self.low_quantile)
-        high_value = np.quantile(X, self.high_quantile)
-
-        is_low = X < low_value
-        is_high = X > high_value
-
-        # divide the data into bins that contain both the "min" and the "max"
-        bin_edge_indeces = []
-
-        bin_has_low = True
-        bin_has_high = True
-
-        # detect bin edges, i.e., every time a low and a high value lie on the same segment
-        for i in range(len(X)):
-            bin_has_low = bin_has_low or is_low[i]
-            bin_has_high = bin_has_high or is_high[i]
-
-            if bin_has_low and bin_has_high:
-                bin_edge_indeces += [i]
-                bin_has_low = False
-                bin_has_high = False
-
-        # put all items into their bins
-        bin_edge_indeces = sorted(bin_edge_indeces)
-        previous_index = 0
-        for i, edge_index in enumerate(bin_edge_indeces):
-            # avoid creating empty bins
-            if len(self.linearization[previous_index:edge_index]) == 0:
-                continue
+        low_value, high_value = np.quantile(X, [self.low_quantile, self.high_quantile])
 
-            subdivision[i] = self.linearization[previous_index:edge_index]
-            previous_index = edge_index
+        # the index of the next low (high) value at or after each index, len(X) if there is none
+        positions = np.arange(len(X))
+        next_low = np.where(X < low_value, positions, len(X))
+        next_low = np.minimum.accumulate(next_low[::-1])[::-1]
+        next_high = np.where(X > high_value, positions, len(X))
+        next_high = np.minimum.accumulate(next_high[::-1])[::-1]
 
-        # create a bin for the remaining items "after" the last bin edge
-        subdivision[len(bin_edge_indeces)] = self.linearization[previous_index:]
+        # the first edge is at 0, every following edge is where both the next low and the next
+        # high value after the previous edge have been seen, so this loop runs once per bin
+        bin_edge_indeces = [0]
+        while bin_edge_indeces[-1] + 1 < len(X):
+            i = bin_edge_indeces[-1] + 1
+            edge_index = max(next_low[i], next_high[i])
+            if edge_index == len(X):
+                break
+            bin_edge_indeces += [int(edge_index)]
 
-        return subdivision
+        return np.array(bin_edge_indeces, dtype=np.int64)
 
 
 class SubdivisionInterval(Subdivision):
@@ -174,14 +205,14 @@ class SubdivisionInterval(Subdivision):
     def subdivide(self):
         # NOTE: this subdivision requires that the data was sorted by self.attribute in the
         # linearization step, otherwise it re-sorts the input (breaking the linearization idea)
-        subdivision = {}
-
         X = self.linearization[:, self.attribute]
 
         # assigns a label (i.e., a bin) along every attribute
         y = np.digitize(X, bins=np.histogram(X, bins=self.chunk_size)[1])
 
-        for label in np.unique(y):
-            subdivision[label] = self.linearization[y == label]
-
-        return subdivision
+        # group the items by label in a single (stable) sort, which keeps their order in the bins
+        labels, counts = np.unique(y, return_counts=True)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return Buckets(
+            self.linearization, offsets, index=np.argsort(y, kind="stable"), keys=labels
+        )
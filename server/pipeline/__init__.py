@@ -1,4 +1,8 @@
 from .constants import *
+from .Cache import *
+from .Buckets import *
+from .RangeIndex import *
+from .ColumnarLinearization import *
 from .LinearizationReader import *
 from .Subdivision import *
 from .Selection import *
@@ -1,8 +1,19 @@
 from typing import List
+import heapq
 
 import networkx as nx
 import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from scipy.sparse.csgraph import (
+    breadth_first_order,
+    connected_components,
+    depth_first_order,
+    laplacian,
+    minimum_spanning_tree,
+    reverse_cuthill_mckee,
+)
+from scipy.sparse.linalg import lobpcg
 
 from Linearization import *
 
@@ -11,6 +22,103 @@ class GraphLinearization(Linearization):
     """Abstract class for linearizations on graph data, extends the base linearization class to
     account for the different structure of the data."""
 
+    # "networkx" mutates networkx graphs edge by edge, "sparse" works on edge arrays and
+    # scipy.sparse adjacency matrices instead, which scales to graphs with millions of edges. Both
+    # return the same order. Linearizations without a sparse engine ignore it.
+    engine = "networkx"
+
+    def get_edges(self):
+        """Returns the node labels (sorted ascending) and the edges of the data as indices into
+        them, plus the rank of each node by its first appearance in the edge list (which is the
+        order of the nodes in a networkx graph built from the edges)."""
+        edges = np.asarray(self.data[:, [1, 2]])
+        labels, inverse = np.unique(edges, return_inverse=True)
+        edges = inverse.reshape(edges.shape)
+        return labels, edges, _get_appearance_rank(edges, len(labels))
+
+    def connect_components_sparse(
+        self, labels: np.ndarray, edges: np.ndarray, rank: np.ndarray
+    ):
+        """Sparse version of connect_components, which links the components in the order of their
+        first appearance in the edge list. networkx takes the first node in the set of nodes of a
+        component, so the nodes of each component are put into a set in the same order: the order
+        in which a breadth-first search from its first node discovers them."""
+        n_nodes = len(rank)
+        n_components, components = connected_components(
+            _adjacency(edges, n_nodes), directed=False
+        )
+        if n_components == 1:
+            return edges
+
+        # one search for all components, which discovers the nodes of each component in the same
+        # order as a search from its first node
+        roots = _get_component_roots(components, n_components, rank)
+        discovered, _ = _breadth_first_search(
+            _get_first_occurrences(edges, n_nodes), roots, n_nodes
+        )
+
+        # sorting them by component (by appearance) keeps that order
+        component_positions = np.empty(n_components, dtype=np.int64)
+        component_positions[components[roots]] = np.arange(n_components)
+        discovered = discovered[
+            np.argsort(component_positions[components[discovered]], kind="stable")
+        ]
+        splits = np.cumsum(np.bincount(components)[components[roots]])[:-1]
+        first_nodes = np.array(
+            [
+                next(iter(set(nodes.tolist())))
+                for nodes in np.split(labels[discovered], splits)
+            ]
+        )
+
+        # like networkx, there is no edge from a component whose node is 0 (which is falsy)
+        first_nodes = np.searchsorted(labels, first_nodes)
+        chain = np.stack([first_nodes[:-1], first_nodes[1:]], axis=1)
+        return np.concatenate([edges, chain[labels[first_nodes[:-1]] != 0]])
+
+    def remove_cycles_sparse(self, edges: np.ndarray, rank: np.ndarray):
+        """Sparse version of remove_cycles, returns the edges of the breadth-first spanning forest
+        without duplicates, in the order of their first appearance."""
+        n_components, components = connected_components(
+            _adjacency(edges, len(rank)), directed=False
+        )
+        edges = _get_first_occurrences(edges, len(rank))
+        roots = _get_component_roots(components, n_components, rank)
+        _, predecessors = _breadth_first_search(edges, roots, len(rank))
+
+        is_tree = (predecessors[edges[:, 1]] == edges[:, 0]) | (
+            predecessors[edges[:, 0]] == edges[:, 1]
+        )
+        return edges[is_tree]
+
+    def get_graph_edges_sparse(self, edges: np.ndarray, rank: np.ndarray):
+        """Returns the edges in the order in which networkx iterates over the edges of a graph
+        built from them (G.edges), given the rank of each node in the order of its nodes: by the
+        rank of their first node, then in the order in which they were added. Duplicate edges are
+        dropped, and each edge is oriented from the node with the lower rank."""
+        is_forward = rank[edges[:, 0]] <= rank[edges[:, 1]]
+        first = np.where(is_forward, edges[:, 0], edges[:, 1]).astype(np.int64)
+        second = np.where(is_forward, edges[:, 1], edges[:, 0]).astype(np.int64)
+        _, first_occurrences = np.unique(first * len(rank) + second, return_index=True)
+        first_occurrences.sort()
+
+        order = np.argsort(rank[first[first_occurrences]], kind="stable")
+        edges = first_occurrences[order]
+        return np.stack([first[edges], second[edges]], axis=1)
+
+    def get_edge_locality(self) -> float:
+        """Returns the average distance between the positions of the two nodes of an edge in the
+        linearization (lower is better), which measures how well it keeps neighbors together."""
+        labels, edges, _ = self.get_edges()
+        linearization = np.asarray(self.linearization)
+
+        positions = np.full(len(labels), np.nan)
+        positions[np.searchsorted(labels, linearization)] = np.arange(
+            len(linearization)
+        )
+        distances = np.abs(positions[edges[:, 0]] - positions[edges[:, 1]])
+        return float(np.nanmean(distances[edges[:, 0] != edges[:, 1]]))
+
     def connect_components(self, G: nx.Graph) -> nx.Graph:
         """Adds simple edges between disconnected components of a given graph, thereby making it
         connected."""
@@ -25,15 +133,15 @@ class GraphLinearization(Linearization):
         return G
 
     def remove_cycles(self, G: nx.Graph) -> nx.Graph:
-        is_cyclic = True
-
-        while is_cyclic:
-            try:
-                cycle = nx.find_cycle(G)
-                G.remove_edge(*cycle[0])
-            except (nx.NetworkXError, nx.NetworkXNoCycle):
-                is_cyclic = False
-
+        """Removes all edges that are not in the breadth-first spanning forest of a given graph,
+        which starts at the first node of each component, in one pass over the graph."""
+        forest = nx.Graph()
+        for node in G:
+            if node not in forest:
+                forest.add_node(node)
+                forest.add_edges_from(nx.bfs_edges(G, node))
+
+        G.remove_edges_from([edge for edge in G.edges if not forest.has_edge(*edge)])
         return G
 
 
@@ -60,6 +168,9 @@ class BasicGraphLinearization(GraphLinearization):
     in order of appearance of predecessors/successors to a node."""
 
     def linearize(self) -> np.ndarray:
+        if self.engine == "sparse":
+            return self.linearize_sparse()
+
         G_ = nx.from_edgelist(self.data[:, [1, 2]])
 
         # graph may be disconnected, so as a first step, add edges between its conn. components
@@ -113,12 +224,49 @@ class BasicGraphLinearization(GraphLinearization):
         self.write_data("BasicGraph")
         return self.linearization
 
+    def linearize_sparse(self) -> np.ndarray:
+        """Same algorithm on edge arrays: the spanning forest comes from one breadth-first search,
+        only the rewiring runs node by node, since each node rewires the edges that the nodes
+        before it left."""
+        labels, edges, rank = self.get_edges()
+        edges = self.connect_components_sparse(labels, edges, rank)
+        edges = self.get_graph_edges_sparse(
+            self.remove_cycles_sparse(edges, rank), rank
+        )
+
+        # the rounds visit the nodes in their order in the directed graph built from these edges
+        nodes = np.unique(edges.ravel(), return_index=True)
+        nodes = nodes[0][np.argsort(nodes[1])]
+        edges = _rewire_basic(edges, nodes, len(labels))
+
+        # start and endpoint are the two nodes with degree 1, the path follows the directed edges
+        degrees = np.bincount(edges.ravel(), minlength=len(labels))
+        endpoints = nodes[degrees[nodes] == 1]
+        _, predecessors = breadth_first_order(
+            _adjacency(edges, len(labels)), endpoints[0], directed=True
+        )
+        if predecessors[endpoints[1]] < 0:
+            raise nx.NetworkXNoPath(
+                f"No path between {endpoints[0]} and {endpoints[1]}."
+            )
+
+        path = [endpoints[1]]
+        while path[-1] != endpoints[0]:
+            path.append(predecessors[path[-1]])
+
+        self.linearization = labels[path[::-1]]
+        self.write_data("BasicGraph")
+        return self.linearization
+
 
 class WeightedGraphLinearization(GraphLinearization):
     def linearize(self) -> np.ndarray:
         """An implementation of the naïve linearization algorithm without optimization as a basic
         proof-of-concept of using graph algorithms in the pipeline. Uses node id as weights to
         "sort" the local neighborhoods."""
+        if self.engine == "sparse":
+            return self.linearize_sparse()
+
         G_ = nx.from_edgelist(self.data[:, [1, 2]])
 
         # graph may be disconnected, so as a first step, add edges between its conn. components
@@ -185,10 +333,52 @@ class WeightedGraphLinearization(GraphLinearization):
         self.write_data("WeightedGraph")
         return self.linearization
 
+    def linearize_sparse(self) -> np.ndarray:
+        """Same algorithm on edge arrays: since node indices are ordered like the node ids, the
+        rewiring of all nodes in a round reduces to sorting the edges."""
+        labels, edges, rank = self.get_edges()
+        edges = self.connect_components_sparse(labels, edges, rank)
+        edges = self.get_graph_edges_sparse(edges[edges[:, 0] != edges[:, 1]], rank)
+
+        # the rounds visit the nodes in their order in the graph built from these edges
+        rank = _get_appearance_rank(edges, len(labels))
+        degrees = np.bincount(edges.ravel(), minlength=len(labels))
+        last_edges = None
+        while degrees.max() > 2:
+            last_edges = edges
+            edges = _rewire_weighted(edges, len(labels))
+            degrees = np.bincount(edges.ravel(), minlength=len(labels))
+
+        # the path starts at the endpoint (with degree 1) that was added to the graph first, which
+        # is the first one in the rewired edges of the last round (in the order of the rounds)
+        if last_edges is not None:
+            rewired, owners, is_right = _get_rewired_edges(last_edges, len(labels))
+            order = np.lexsort((is_right, rank[owners]))
+            rank = _get_appearance_rank(rewired[order], len(labels))
+
+        # where the networkx engine fails because the edges form a cycle, start at the first node
+        endpoints = np.flatnonzero(degrees == 1)
+        if len(endpoints) == 0:
+            endpoints = np.arange(len(labels))
+        start = int(endpoints[np.argmin(rank[endpoints])])
+        path = depth_first_order(
+            _adjacency(edges, len(labels)),
+            start,
+            directed=False,
+            return_predecessors=False,
+        )
+
+        self.linearization = labels[path]
+        self.write_data("WeightedGraph")
+        return self.linearization
+
 
 class SpanningTreeGraphLinearization(GraphLinearization):
     def linearize(self) -> np.ndarray:
         """Linearize the graph by traversing one of its spanning trees via depth-first search."""
+        if self.engine == "sparse":
+            return self.linearize_sparse()
+
         G = nx.from_edgelist(self.data[:, [1, 2]])
 
         # graph may be disconnected, so as a first step, add edges between its conn. components
@@ -206,6 +396,35 @@ class SpanningTreeGraphLinearization(GraphLinearization):
         self.write_data("SpanningTreeGraph")
         return self.linearization
 
+    def linearize_sparse(self) -> np.ndarray:
+        """Same algorithm on a sparse adjacency matrix. Kruskal's algorithm in networkx takes the
+        edges (which all have the same weight) in their order in the graph, so the spanning tree is
+        the minimum spanning tree with these positions as weights, which is unique. The search
+        visits the neighbors of a node in the order in which their edges were added to the tree."""
+        labels, edges, rank = self.get_edges()
+        edges = self.connect_components_sparse(labels, edges, rank)
+        edges = self.get_graph_edges_sparse(edges, rank)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+
+        weights = np.arange(1, len(edges) + 1, dtype=np.float64)
+        tree = minimum_spanning_tree(
+            coo_matrix(
+                (weights, (edges[:, 0], edges[:, 1])),
+                shape=(len(labels), len(labels)),
+            )
+        ).tocoo()
+        order = np.argsort(tree.data)
+
+        path = depth_first_order(
+            _ordered_adjacency(tree.row[order], tree.col[order], len(labels)),
+            int(np.argmin(rank)),
+            directed=True,
+            return_predecessors=False,
+        )
+        self.linearization = labels[path]
+        self.write_data("SpanningTreeGraph")
+        return self.linearization
+
 
 class EdgeUnawareGraphLinearization(GraphLinearization):
     def linearize(self) -> np.ndarray:
@@ -216,3 +435,355 @@ class EdgeUnawareGraphLinearization(GraphLinearization):
         self.linearization = nodes[nodes.argsort()]
         self.write_data("EdgeUnawareGraph")
         return self.linearization
+
+
+class ReverseCuthillMcKeeGraphLinearization(GraphLinearization):
+    def linearize(self) -> np.ndarray:
+        """Orders the nodes by the reverse Cuthill-McKee algorithm, which reduces the bandwidth of
+        the adjacency matrix, i.e., the largest distance between the nodes of an edge."""
+        labels, edges, _ = self.get_edges()
+        order = reverse_cuthill_mckee(
+            _symmetric_adjacency(edges, len(labels)), symmetric_mode=True
+        )
+
+        self.linearization = labels[order]
+        self.write_data("ReverseCuthillMcKeeGraph")
+        return self.linearization
+
+
+class SpectralGraphLinearization(GraphLinearization):
+    # components with at most this many nodes are solved with a dense eigensolver, in batches of
+    # at most this many matrix entries
+    dense_size = 1000
+    dense_batch = 2**24
+    # tolerance and iterations of the sparse eigensolver (lobpcg) for larger components
+    tolerance = 1e-4
+    max_iterations = 500
+
+    def linearize(self) -> np.ndarray:
+        """Orders the nodes of each connected component by its Fiedler vector (the eigenvector of
+        the second smallest eigenvalue of the Laplacian), which places the nodes on a line such
+        that the squared distances between the nodes of edges are minimal. Components are
+        ordered by their first appearance in the data."""
+        labels, edges, rank = self.get_edges()
+        adjacency = _symmetric_adjacency(edges, len(labels))
+        n_components, components = connected_components(adjacency, directed=False)
+
+        first_appearance = np.full(n_components, len(labels))
+        np.minimum.at(first_appearance, components, rank)
+        component_positions = np.argsort(np.argsort(first_appearance))
+
+        # nodes of components with one or two nodes keep the order of their appearance
+        values = rank.astype(np.float64)
+        sizes = np.bincount(components)
+        nodes_by_component = np.argsort(components, kind="stable")
+        starts = np.cumsum(sizes) - sizes
+
+        # smaller components are solved together, stacked by their size
+        small_sizes = np.unique(sizes[(sizes > 2) & (sizes <= self.dense_size)])
+        for size in small_sizes:
+            batch_size = max(1, self.dense_batch // size**2)
+            small_components = np.flatnonzero(sizes == size)
+            for batch in np.split(
+                small_components,
+                np.arange(batch_size, len(small_components), batch_size),
+            ):
+                nodes = nodes_by_component[starts[batch, None] + np.arange(size)]
+                values[nodes] = self.get_fiedler_vectors(adjacency, nodes, rank[nodes])
+
+        for component in np.flatnonzero(sizes > self.dense_size):
+            nodes = nodes_by_component[
+                starts[component] : starts[component] + sizes[component]
+            ]
+            values[nodes] = self.get_fiedler_vector(
+                adjacency[nodes][:, nodes], rank[nodes]
+            )
+
+        order = np.lexsort((values, component_positions[components]))
+        self.linearization = labels[order]
+        self.write_data("SpectralGraph")
+        return self.linearization
+
+    def get_fiedler_vectors(self, adjacency, nodes: np.ndarray, rank: np.ndarray):
+        """Fiedler vectors of components with the same number of nodes, given as rows of nodes,
+        from one dense eigensolver call on their stacked Laplacians."""
+        n_components, size = nodes.shape
+        local = np.empty(adjacency.shape[0], dtype=np.int64)
+        local[nodes] = np.arange(size)
+        row, column = adjacency[nodes.ravel()].nonzero()
+
+        laplacians = np.zeros((n_components, size, size))
+        laplacians[row // size, row % size, local[column]] = -1
+        diagonal = np.arange(size)
+        laplacians[:, diagonal, diagonal] = -laplacians.sum(axis=2)
+
+        _, vectors = np.linalg.eigh(laplacians)
+        vectors = vectors[:, :, 1]
+
+        # the sign of an eigenvector is arbitrary, so start with the first node in the data
+        first = vectors[np.arange(n_components), np.argmin(rank, axis=1)]
+        return np.where(first[:, None] > 0, -vectors, vectors)
+
+    def get_fiedler_vector(self, adjacency, rank: np.ndarray) -> np.ndarray:
+        # the constant vector is the eigenvector of the smallest eigenvalue (0), so search
+        # orthogonal to it, with the inverse degrees as (Jacobi) preconditioner
+        graph_laplacian = laplacian(adjacency.astype(np.float64))
+        n_nodes = adjacency.shape[0]
+        initial = np.random.default_rng(0).random((n_nodes, 2))
+        _, vectors = lobpcg(
+            graph_laplacian,
+            initial,
+            Y=np.ones((n_nodes, 1)),
+            M=diags(1 / graph_laplacian.diagonal()),
+            tol=self.tolerance,
+            maxiter=self.max_iterations,
+            largest=False,
+        )
+        vector = vectors[:, 0]
+
+        # the sign of the eigenvector is arbitrary, so start with the first node in the data
+        return -vector if vector[np.argmin(rank)] > 0 else vector
+
+
+def _adjacency(edges: np.ndarray, n_nodes: int):
+    """Sparse (CSR) adjacency matrix of the directed edges."""
+    weights = np.ones(len(edges), dtype=np.int8)
+    adjacency = coo_matrix(
+        (weights, (edges[:, 0], edges[:, 1])), shape=(n_nodes, n_nodes)
+    )
+    return adjacency.tocsr()
+
+
+def _symmetric_adjacency(edges: np.ndarray, n_nodes: int):
+    """Sparse (CSR) adjacency matrix of the undirected edges, without self-loops and with all
+    weights set to 1."""
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    adjacency = _adjacency(np.concatenate([edges, edges[:, ::-1]]), n_nodes)
+    adjacency.data[:] = 1
+    return adjacency
+
+
+def _unique_edges(edges: np.ndarray, n_nodes: int) -> np.ndarray:
+    """Removes duplicate undirected edges, returns each edge as (smaller node, larger node)."""
+    smaller = np.minimum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    larger = np.maximum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    codes = np.unique(smaller * n_nodes + larger)
+    return np.stack([codes // n_nodes, codes % n_nodes], axis=1)
+
+
+def _ordered_adjacency(sources: np.ndarray, targets: np.ndarray, n_nodes: int):
+    """Sparse (CSR) adjacency matrix of the undirected edges, which lists the neighbors of each
+    node in the order of the edges. scipy keeps that order when traversing the graph, as long as
+    it does not convert the matrix (which sorts the neighbors), so the weights are float64."""
+    nodes = np.concatenate([sources, targets])
+    neighbors = np.concatenate([targets, sources])
+    order = np.lexsort((np.tile(np.arange(len(sources)), 2), nodes))
+    indptr = np.append(0, np.cumsum(np.bincount(nodes, minlength=n_nodes)))
+    weights = np.ones(len(nodes), dtype=np.float64)
+    return csr_matrix((weights, neighbors[order], indptr), shape=(n_nodes, n_nodes))
+
+
+def _get_appearance_rank(edges: np.ndarray, n_nodes: int) -> np.ndarray:
+    """The rank of each node by its first appearance in the edges (which is the order of the
+    nodes in a networkx graph built from them), nodes that do not appear come last."""
+    nodes, first_appearance = np.unique(edges.ravel(), return_index=True)
+    rank = np.full(n_nodes, n_nodes, dtype=np.int64)
+    rank[nodes[np.argsort(first_appearance)]] = np.arange(len(nodes))
+    return rank
+
+
+def _get_first_occurrences(edges: np.ndarray, n_nodes: int) -> np.ndarray:
+    """Removes self-loops and duplicate undirected edges, keeps the first occurrence of each edge
+    in the order of the edges."""
+    smaller = np.minimum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    larger = np.maximum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    _, first_occurrences = np.unique(smaller * n_nodes + larger, return_index=True)
+    edges = edges[np.sort(first_occurrences)]
+    return edges[edges[:, 0] != edges[:, 1]]
+
+
+def _get_component_roots(
+    components: np.ndarray, n_components: int, rank: np.ndarray
+) -> np.ndarray:
+    """The first node (by rank) of each connected component, in the order of their rank."""
+    roots = np.full(n_components, len(rank))
+    np.minimum.at(roots, components, rank)
+    return np.argsort(rank)[np.sort(roots)]
+
+
+def _breadth_first_search(edges: np.ndarray, roots: np.ndarray, n_nodes: int):
+    """Breadth-first search through the undirected edges from each of the roots in turn, which
+    visits the neighbors of a node in the order of the edges, like networkx. Returns the nodes in
+    the order of their discovery and the predecessor of each node (n_nodes for the roots)."""
+    sources = np.append(edges[:, 0], np.full(len(roots), n_nodes))
+    targets = np.append(edges[:, 1], roots)
+    discovered, predecessors = breadth_first_order(
+        _ordered_adjacency(sources, targets, n_nodes + 1),
+        n_nodes,
+        directed=True,
+        return_predecessors=True,
+    )
+    return discovered[1:], predecessors[:n_nodes]
+
+
+def _rewire_basic(edges: np.ndarray, nodes: np.ndarray, n_nodes: int) -> np.ndarray:
+    """The rounds of BasicGraphLinearization on the directed edges, until no node has more than
+    two edges. Each node rewires the edges that the nodes before it left, so the rounds run node
+    by node, on lists of the predecessors and successors of each node in networkx's order."""
+    rewiring = _BasicRewiring(edges, nodes, n_nodes)
+    while rewiring.n_high_degrees > 0:
+        rewiring.rewire_left()
+        rewiring.rewire_right()
+    return rewiring.get_edges()
+
+
+class _BasicRewiring:
+    """Directed edges that the rounds of BasicGraphLinearization rewire. A round only visits the
+    nodes with more than one predecessor (successor), in the order of the nodes: nodes that gain
+    one after the current node are visited in the same pass, all others in the next round. Since
+    the number of rounds grows with the number of nodes, this keeps the rounds from checking all
+    nodes again."""
+
+    def __init__(self, edges: np.ndarray, nodes: np.ndarray, n_nodes: int):
+        self.nodes = nodes.tolist()
+        self.positions = np.empty(n_nodes, dtype=np.int64)
+        self.positions[nodes] = np.arange(len(nodes))
+        self.positions = self.positions.tolist()
+
+        self.predecessors = [{} for _ in range(n_nodes)]
+        self.successors = [{} for _ in range(n_nodes)]
+        self.degrees = [0] * n_nodes
+        self.n_high_degrees = 0
+
+        # the nodes to visit in the next left (right) pass, and the pass that is running
+        self.left_nodes = set()
+        self.right_nodes = set()
+        self.left_heap = None
+        self.right_heap = None
+        self.position = -1
+
+        for source, target in edges.tolist():
+            self.add_edge(source, target)
+
+    def rewire_left(self):
+        """Replaces the edges from the predecessors p1, ..., pk of each node by the edges
+        (p1, p2), ..., (pk, node)."""
+        for node in self._visit("left"):
+            left_neighbors = list(self.predecessors[node])
+            if len(left_neighbors) > 1:
+                for neighbor in left_neighbors:
+                    self.remove_edge(neighbor, node)
+                for source, target in zip(left_neighbors, left_neighbors[1:] + [node]):
+                    self.add_edge(source, target)
+
+    def rewire_right(self):
+        """Replaces the edges to the successors s1, ..., sk of each node by the edges
+        (node, s1), ..., (sk-1, sk)."""
+        for node in self._visit("right"):
+            right_neighbors = list(self.successors[node])
+            if len(right_neighbors) > 1:
+                for neighbor in right_neighbors:
+                    self.remove_edge(node, neighbor)
+                for source, target in zip(
+                    [node] + right_neighbors[:-1], right_neighbors
+                ):
+                    self.add_edge(source, target)
+
+    def _visit(self, side: str):
+        # yields the nodes to visit in this pass, in their order
+        heap = [self.positions[node] for node in getattr(self, f"{side}_nodes")]
+        heapq.heapify(heap)
+        setattr(self, f"{side}_nodes", set())
+        setattr(self, f"{side}_heap", heap)
+
+        while heap:
+            self.position = heapq.heappop(heap)
+            while heap and heap[0] == self.position:
+                heapq.heappop(heap)
+            yield self.nodes[self.position]
+
+        setattr(self, f"{side}_heap", None)
+        self.position = -1
+
+    def _schedule(self, node, side: str):
+        # a node that gained an edge is visited later in the running pass, or in the next one
+        heap = getattr(self, f"{side}_heap")
+        if heap is not None and self.positions[node] > self.position:
+            heapq.heappush(heap, self.positions[node])
+        else:
+            getattr(self, f"{side}_nodes").add(node)
+
+    def add_edge(self, source, target):
+        # like networkx, an edge that exists already keeps its position
+        if target in self.successors[source]:
+            return
+        self.successors[source][target] = None
+        self.predecessors[target][source] = None
+        self._update_degree(source, 1)
+        self._update_degree(target, 1)
+
+        if len(self.successors[source]) > 1:
+            self._schedule(source, "right")
+        if len(self.predecessors[target]) > 1:
+            self._schedule(target, "left")
+
+    def remove_edge(self, source, target):
+        del self.successors[source][target]
+        del self.predecessors[target][source]
+        self._update_degree(source, -1)
+        self._update_degree(target, -1)
+
+    def _update_degree(self, node, change: int):
+        was_high = self.degrees[node] > 2
+        self.degrees[node] += change
+        self.n_high_degrees += (self.degrees[node] > 2) - was_high
+
+    def get_edges(self) -> np.ndarray:
+        edges = [
+            (source, target)
+            for source in self.nodes
+            for target in self.successors[source]
+        ]
+        return np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def _rewire_weighted(edges: np.ndarray, n_nodes: int) -> np.ndarray:
+    """One round of WeightedGraphLinearization for all nodes at once: the smaller neighbors
+    u1 < ... < ul of each node are replaced by the edges (u1, u2), ..., (ul, node), its larger
+    neighbors w1 < ... < wm by (node, w1), ..., (wm-1, wm)."""
+    rewired, _, _ = _get_rewired_edges(edges, n_nodes)
+    return _unique_edges(rewired, n_nodes)
+
+
+def _get_rewired_edges(edges: np.ndarray, n_nodes: int):
+    """The edges that one round of WeightedGraphLinearization adds for each node (including
+    duplicates), with the node that adds each edge and whether it replaces one of its larger
+    neighbors. The edges of each node are ordered like in the networkx engine."""
+    # sort the neighbors of each node, encoded as node * n_nodes + neighbor
+    codes = np.concatenate(
+        [edges[:, 0] * n_nodes + edges[:, 1], edges[:, 1] * n_nodes + edges[:, 0]]
+    )
+    codes.sort()
+    nodes, neighbors = np.divmod(codes, n_nodes)
+    del codes
+
+    left = neighbors < nodes
+    left_nodes, left_neighbors = nodes[left], neighbors[left]
+    is_last = np.append(left_nodes[1:] != left_nodes[:-1], True)
+    left_edges = np.stack(
+        [left_neighbors, np.where(is_last, left_nodes, np.roll(left_neighbors, -1))],
+        axis=1,
+    )
+
+    right_nodes, right_neighbors = nodes[~left], neighbors[~left]
+    is_first = np.insert(right_nodes[1:] != right_nodes[:-1], 0, True)
+    right_edges = np.stack(
+        [np.where(is_first, right_nodes, np.roll(right_neighbors, 1)), right_neighbors],
+        axis=1,
+    )
+    is_right = np.repeat([False, True], [len(left_edges), len(right_edges)])
+    return (
+        np.concatenate([left_edges, right_edges]),
+        np.concatenate([left_nodes, right_nodes]),
+        is_right,
+    )
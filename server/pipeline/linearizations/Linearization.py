@@ -1,34 +1,78 @@
 from abc import ABC, abstractmethod
 import csv
 import functools
+import hashlib
+import io
+import json
+import os
 import pathlib
+import tempfile
 
 import numpy as np
 import pandas as pd
-import pymorton as pm
-from sklearn.neighbors import KDTree
+from sklearn.neighbors import KDTree, NearestNeighbors
 
 
 class Linearization(ABC):
-    def __init__(self, data_set_name, dimensions, exclude_attributes=[]):
+    # folder that the linearization files are written to, which the readers read from
+    files_folder = (
+        str(pathlib.Path(__file__).parent.absolute()) + "/../linearization_files"
+    )
+    # whether the linearization sorts the rows by the keys that get_keys(data) returns for them,
+    # either one-dimensional or several uint64 words per row (most significant first). Only such
+    # linearizations can be built out of core (linearize_external) or extended by new rows
+    # (append_rows)
+    sorts_by_keys = False
+
+    def __init__(self, data_set_name, dimensions, exclude_attributes=[], data=None):
         self.exclude_attributes = exclude_attributes
         self.data_set_name = data_set_name
         self.dimensions = dimensions
         self.linearization = None
+        # permutation of the rows in self.data that yields the linearization
+        self.order = None
+        # for linearizations that sort the rows by a key: the keys in the order of the
+        # linearization, plus the parameters needed to compute keys of new rows (see append_rows)
+        self.keys = None
+        self.key_params = {}
+        # identifies the inputs of the linearization, stored in the manifest if set
+        self.fingerprint = None
         self.header = ""
-        self.data = self.read_data()
+        # already parsed data (e.g., the memory-mapped base file) can be passed in, otherwise
+        # the data file is parsed on first access
+        self.data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.read_data()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
 
-    def read_data(self):
+    def get_data_file(self):
         current_folder = pathlib.Path(__file__).parent.absolute()
-        file_to_read = (
-            str(current_folder) + "/datasets/" + self.data_set_name + "Data.csv"
-        )
+        return str(current_folder) + "/datasets/" + self.data_set_name + "Data.csv"
+
+    def get_linearization_file(self, linearization_type):
+        """Returns the path of the linearization's files, without file ending."""
+        file_name = self.data_set_name + "Linearization" + linearization_type
+        return self.files_folder + "/" + file_name
+
+    def read_data(self, start=0):
+        """Parses the data file, skipping its first `start` rows (e.g., to only read new rows)."""
+        file_to_read = self.get_data_file()
 
-        df = pd.read_csv(file_to_read, delimiter=";", header=None)
+        try:
+            df = pd.read_csv(file_to_read, delimiter=";", header=None, skiprows=start)
+        except pd.errors.EmptyDataError:
+            return np.empty((0, 0))
         df = df.drop(self.exclude_attributes, axis=1)
         data = df.to_numpy()
 
-        data[:, 0] = np.array(range(0, len(data)))
+        data[:, 0] = np.array(range(start, start + len(data)))
 
         return data
 
@@ -36,75 +80,560 @@ class Linearization(ABC):
     def linearize(self):
         pass
 
-    def write_data(self, linearization_type):
-        current_folder = pathlib.Path(__file__).parent.absolute()
-        file_name = self.data_set_name + "Linearization" + linearization_type + ".csv"
-        file_name = str(current_folder) + "/../linearization_files/" + file_name
-        pd.DataFrame(self.linearization).to_csv(
-            file_name, sep=";", header=False, index=False
+    def write_data(self, linearization_type, export_csv=False, file_format=None):
+        """Stores the linearization in the linearization_files folder, plus a small .json
+        manifest. The default format, "order", only stores the permutation of the dataset's rows
+        (as int32/int64 .order.npy file), while the data itself is stored once in a base file that
+        is shared by all linearizations of the dataset. Linearizations that are not a permutation
+        of the data rows are stored in the "npy" format, i.e., as a binary copy of the data that
+        readers can memory-map. Alternatively, file_format="arrow" or "parquet" (requires pyarrow)
+        stores a columnar copy, from which readers can load single columns. Pass export_csv=True
+        to also export the legacy semicolon-separated file."""
+        file_name = self.get_linearization_file(linearization_type)
+
+        if file_format is None:
+            file_format = "npy" if self.order is None else "order"
+
+        manifest = {
+            "format": file_format,
+            "data_set_name": self.data_set_name,
+            "linearization": linearization_type,
+        }
+        if self.fingerprint is not None:
+            manifest["fingerprint"] = self.fingerprint
+
+        if file_format == "order":
+            order = np.asarray(self.order)
+            order = order.astype(np.int32 if len(order) < 2**31 else np.int64)
+            manifest["base"] = self.write_base_data()
+            manifest["shape"] = list(order.shape)
+            manifest["dtype"] = str(order.dtype)
+
+            if self.keys is not None:
+                # keys are stored alongside the order, so that append_rows can merge new rows
+                manifest["keys"] = os.path.basename(file_name) + ".keys.npy"
+                manifest["key_params"] = self.key_params
+                with open(file_name + ".keys.npy.tmp", "wb") as f:
+                    np.save(f, np.asarray(self.keys))
+                os.replace(file_name + ".keys.npy.tmp", file_name + ".keys.npy")
+
+            with open(file_name + ".order.npy.tmp", "wb") as f:
+                np.save(f, order)
+            os.replace(file_name + ".order.npy.tmp", file_name + ".order.npy")
+            with open(file_name + ".order.json", "w") as f:
+                json.dump(manifest, f)
+        else:
+            linearization = _to_float_array(self.linearization)
+            manifest["shape"] = list(linearization.shape)
+            manifest["dtype"] = str(linearization.dtype)
+
+            tmp_file_name = f"{file_name}.{file_format}.tmp"
+            if file_format == "npy":
+                with open(tmp_file_name, "wb") as f:
+                    np.save(f, linearization)
+            else:
+                _write_columnar(linearization, tmp_file_name, file_format)
+            os.replace(tmp_file_name, f"{file_name}.{file_format}")
+            with open(file_name + ".json", "w") as f:
+                json.dump(manifest, f)
+
+        if export_csv:
+            pd.DataFrame(self.linearization).to_csv(
+                file_name + ".csv", sep=";", header=False, index=False
+            )
+        print(f"Saved linearized data in {file_name} ({file_format})")
+
+    def write_base_data(self, force=False) -> str:
+        """Writes the (unordered) data into the base file of the dataset, unless it is up to date
+        (or force is set).
+        Since the data depends on the excluded attributes, they are part of the file name.
+        Returns the name of the base file."""
+        base_name = self.get_base_name()
+        base_file = self.files_folder + "/" + base_name
+
+        data_file_time = os.path.getmtime(self.get_data_file())
+        if (
+            not force
+            and os.path.exists(base_file)
+            and os.path.getmtime(base_file) >= data_file_time
+        ):
+            return base_name
+
+        with open(base_file + ".tmp", "wb") as f:
+            np.save(f, _to_float_array(self.data))
+        os.replace(base_file + ".tmp", base_file)
+        return base_name
+
+    def fit_keys(self, blocks):
+        """Sets the key parameters that depend on all rows (e.g., normalization extrema), before
+        linearize_external computes the keys block by block. blocks() iterates over the rows of
+        the base file."""
+        pass
+
+    def linearize_external(
+        self, linearization_type, block_size=1_000_000, memory_limit=None
+    ):
+        """Out-of-core version of linearize() for linearizations that sort the rows by a key
+        (requires duckdb). The data file (or a Parquet file of the same name) is parsed by
+        DuckDB block by block into the base file, while the keys of each block are passed back to
+        DuckDB. Its external sort spills to disk once the keys exceed memory_limit (e.g. "4GB"),
+        and the sorted order and keys are streamed into the linearization files. So neither the
+        data nor the keys have to fit into memory. Unlike linearize(), rows with equal keys keep
+        their order, and DuckDB parses numbers exactly, while pandas may be off in the last
+        digit."""
+        if not self.sorts_by_keys:
+            raise ValueError(f"{type(self).__name__} does not sort the rows by keys")
+        import duckdb
+
+        file_name = self.get_linearization_file(linearization_type)
+        folder = os.path.dirname(file_name)
+        base_name = self.get_base_name()
+        data_file = self.get_data_file()
+        if not os.path.exists(data_file):
+            data_file = os.path.splitext(data_file)[0] + ".parquet"
+
+        with tempfile.TemporaryDirectory(dir=folder) as tmp_folder:
+            # a database file (instead of an in-memory database) lets DuckDB spill the keys
+            con = duckdb.connect(os.path.join(tmp_folder, "keys.duckdb"))
+            con.execute(f"SET temp_directory='{tmp_folder}'")
+            if memory_limit is not None:
+                con.execute(f"SET memory_limit='{memory_limit}'")
+
+            source = _scan_data_file(con, data_file, self.exclude_attributes)
+            n_rows = con.execute(f"SELECT count(*) FROM {source}").fetchone()[0]
+            base = None
+            keys_table = _KeysTable(con)
+
+            for block in _fetch_blocks(con, f"SELECT * FROM {source}", block_size):
+                start = 0 if base is None else base.start
+                block = block.to_numpy(copy=True)
+                block[:, 0] = np.arange(start, start + len(block))
+                if base is None:
+                    base = _BaseWriter(os.path.join(folder, base_name), n_rows, block)
+                base.write(_to_float_array(block))
+                if type(self).fit_keys is Linearization.fit_keys:
+                    keys_table.insert(block[:, 0], self.get_keys(block))
+            if base is None:
+                raise ValueError(f"{data_file} contains no rows")
+            base.close()
+
+            if type(self).fit_keys is not Linearization.fit_keys:
+                # the keys depend on all rows, so compute them from the base file afterwards
+                data = np.load(os.path.join(folder, base_name), mmap_mode="r")
+                blocks = lambda: (
+                    data[i : i + block_size] for i in range(0, len(data), block_size)
+                )
+                self.fit_keys(blocks)
+                for block in blocks():
+                    keys_table.insert(block[:, 0], self.get_keys(block))
+                del data
+
+            manifest = {
+                "format": "order",
+                "data_set_name": self.data_set_name,
+                "linearization": linearization_type,
+                "base": base_name,
+                "shape": [n_rows],
+                "dtype": "int32" if n_rows < 2**31 else "int64",
+                "keys": os.path.basename(file_name) + ".keys.npy",
+                "key_params": self.key_params,
+            }
+            if self.fingerprint is not None:
+                manifest["fingerprint"] = self.fingerprint
+
+            keys_table.write_sorted(file_name, manifest["dtype"], block_size)
+            con.close()
+
+        with open(file_name + ".order.json", "w") as f:
+            json.dump(manifest, f)
+        print(f"Saved linearized data in {file_name} (order, sorted by duckdb)")
+
+    def get_base_name(self) -> str:
+        base_name = self.data_set_name + "Base"
+        if len(self.exclude_attributes) > 0:
+            excluded = repr(sorted(str(a) for a in self.exclude_attributes))
+            base_name += "-" + hashlib.md5(excluded.encode()).hexdigest()[:8]
+        return base_name + ".npy"
+
+    def append_rows(self, linearization_type):
+        """Extends a stored key-based linearization by the rows that were appended to the data
+        file since it was written, instead of linearizing all rows again: only the keys of the new
+        rows are computed and sorted, and then merged into the stored order and keys in a single
+        pass. The new rows are also appended to the base file. All three files grow in place.
+        Assumes that the existing rows of the data file did not change. Returns the number of
+        appended rows."""
+        if not self.sorts_by_keys:
+            raise ValueError(f"{type(self).__name__} does not sort the rows by keys")
+        file_name = self.get_linearization_file(linearization_type)
+        with open(file_name + ".order.json") as f:
+            manifest = json.load(f)
+        if "keys" not in manifest:
+            raise ValueError(f"{file_name} stores no keys, linearize the data again")
+        if manifest["base"] != self.get_base_name():
+            raise ValueError(f"{file_name} excludes different attributes")
+
+        folder = os.path.dirname(file_name)
+        order = np.load(file_name + ".order.npy", mmap_mode="r")
+        keys = np.load(os.path.join(folder, manifest["keys"]), mmap_mode="r")
+        n_old = len(order)
+
+        new_data = self.read_data(start=n_old)
+        if len(new_data) == 0:
+            return 0
+        _append_to_base(os.path.join(folder, manifest["base"]), new_data, n_old)
+
+        self.key_params = manifest.get("key_params", {})
+        new_keys = self.get_keys(new_data)
+        new_order = np.argsort(_sortable(new_keys), kind="stable")
+        new_keys = new_keys[new_order]
+        # new rows are inserted after existing rows with equal keys
+        positions = np.searchsorted(_sortable(keys), _sortable(new_keys), side="right")
+        del order, keys
+
+        # the order and keys grow in place, and only the part after the first new row is merged
+        n_rows = n_old + len(new_data)
+        order_dtype = np.int32 if n_rows < 2**31 else np.int64
+        self.order = _grow_npy(file_name + ".order.npy", n_rows, order_dtype)
+        self.keys = _grow_npy(os.path.join(folder, manifest["keys"]), n_rows)
+        _merge_tail(self.order, n_old, positions, new_order + n_old)
+        _merge_tail(self.keys, n_old, positions, new_keys)
+        self.order.flush()
+        self.keys.flush()
+
+        manifest["shape"] = [n_rows]
+        manifest["dtype"] = np.dtype(order_dtype).name
+        manifest.pop("fingerprint", None)
+        if self.fingerprint is not None:
+            manifest["fingerprint"] = self.fingerprint
+        with open(file_name + ".order.json", "w") as f:
+            json.dump(manifest, f)
+        print(f"Appended {len(new_data)} rows to {file_name} (order)")
+        return len(new_data)
+
+
+def _append_to_base(base_file: str, new_data: np.ndarray, start: int):
+    """Appends the rows of the data file starting at row `start` to the base file, skipping rows
+    that are already in it (e.g., appended for another linearization of the dataset)."""
+    n_base = len(np.load(base_file, mmap_mode="r"))
+    new_data = _to_float_array(new_data[n_base - start :])
+    if len(new_data) == 0:
+        return
+
+    base = _grow_npy(base_file, n_base + len(new_data))
+    base[n_base:] = new_data
+    base.flush()
+
+
+def _grow_npy(file: str, n_rows: int, dtype=None) -> np.memmap:
+    """Grows the first axis of a .npy file to n_rows in place and returns it as writable memory
+    map. The header is rewritten in place, since numpy pads it for a growing shape; files whose
+    header has no room for it (or whose dtype changes) are rewritten once."""
+    array = np.load(file, mmap_mode="r")
+    dtype = array.dtype if dtype is None else np.dtype(dtype)
+    shape = (n_rows,) + array.shape[1:]
+
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": shape,
+        },
+    )
+    header = header.getvalue()
+
+    if dtype != array.dtype or len(header) != array.offset or np.isfortran(array):
+        with open(file + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(array, dtype=dtype))
+        del array
+        os.replace(file + ".tmp", file)
+        return _grow_npy(file, n_rows)
+    del array
+
+    with open(file, "r+b") as f:
+        f.truncate(len(header) + int(np.prod(shape)) * dtype.itemsize)
+        f.write(header)
+    return np.memmap(file, dtype=dtype, mode="r+", offset=len(header), shape=shape)
+
+
+def _merge_tail(array: np.ndarray, n_old: int, positions: np.ndarray, new_values):
+    """Merges new values into an array that was grown beyond its n_old values, where new value i
+    goes after the old values before positions[i] (positions ascending). Only the part of the
+    array from the first of these positions on is rewritten, in a single pass."""
+    first = int(positions[0])
+    tail = np.array(array[first:n_old])
+    is_new = np.zeros(len(array) - first, dtype=bool)
+    is_new[positions - first + np.arange(len(positions))] = True
+
+    merged = np.empty((len(is_new),) + array.shape[1:], dtype=array.dtype)
+    merged[is_new] = new_values
+    merged[~is_new] = tail
+    array[first:] = merged
+
+
+_DUCKDB_NUMERIC_TYPES = [
+    "BOOLEAN",
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "FLOAT",
+    "DOUBLE",
+    "DECIMAL",
+]
+
+
+def _scan_data_file(con, data_file: str, exclude_attributes) -> str:
+    """Creates a DuckDB view on the data file without the excluded attributes, which are given by
+    their index (like the columns parsed by pandas) or by their name. Returns the view's name."""
+    if data_file.endswith(".parquet"):
+        scan = f"read_parquet('{data_file}')"
+    else:
+        scan = f"read_csv_auto('{data_file}', delim=';', header=False)"
+
+    columns = []
+    for i, (column, column_type, *_) in enumerate(
+        con.execute(f"DESCRIBE SELECT * FROM {scan}").fetchall()
+    ):
+        if i in exclude_attributes or column in exclude_attributes:
+            continue
+        elif column_type.split("(")[0] in _DUCKDB_NUMERIC_TYPES:
+            columns.append(f'"{column}"')
+        else:
+            # pandas does not parse e.g. dates either, so they are passed on as strings
+            columns.append(f'CAST("{column}" AS VARCHAR) AS "{column}"')
+    con.execute(f"CREATE VIEW data AS SELECT {', '.join(columns)} FROM {scan}")
+    return "data"
+
+
+def _fetch_blocks(con, query: str, block_size: int):
+    """Streams the result of the query as DataFrames of about block_size rows."""
+    # a separate cursor, so that queries on con do not invalidate the streamed result
+    result = con.cursor().execute(query)
+    # DuckDB returns results in vectors of 2048 rows
+    vectors_per_block = max(1, block_size // 2048)
+    while True:
+        block = result.fetch_df_chunk(vectors_per_block)
+        if len(block) == 0:
+            return
+        yield block
+
+
+class _BaseWriter:
+    """Writes the base file block by block."""
+
+    def __init__(self, base_file: str, n_rows: int, first_block: np.ndarray):
+        self.base_file = base_file
+        self.start = 0
+        self.base = np.lib.format.open_memmap(
+            base_file + ".tmp",
+            mode="w+",
+            dtype=np.float64,
+            shape=(n_rows, first_block.shape[1]),
+        )
+
+    def write(self, block: np.ndarray):
+        self.base[self.start : self.start + len(block)] = block
+        self.start += len(block)
+
+    def close(self):
+        self.base.flush()
+        del self.base
+        os.replace(self.base_file + ".tmp", self.base_file)
+
+
+class _KeysTable:
+    """DuckDB table of the rows' keys (one column per uint64 word for multi-word keys), which
+    DuckDB sorts out of core."""
+
+    def __init__(self, con):
+        self.con = con
+        self.key_shape = None
+        self.key_dtype = None
+
+    def insert(self, rows: np.ndarray, keys: np.ndarray):
+        keys = np.asarray(keys)
+        block = pd.DataFrame(keys.reshape(len(keys), -1))
+        block.columns = [f"key{i}" for i in range(block.shape[1])]
+        block.insert(0, "row_index", np.asarray(rows, dtype=np.int64))
+
+        self.con.register("block", block)
+        if self.key_shape is None:
+            self.key_shape, self.key_dtype = keys.shape[1:], keys.dtype
+            self.con.execute("CREATE TABLE keys AS SELECT * FROM block")
+        else:
+            self.con.execute("INSERT INTO keys SELECT * FROM block")
+        self.con.unregister("block")
+
+    def write_sorted(self, file_name: str, order_dtype: str, block_size: int):
+        """Sorts the rows by their keys (ties by their index) and streams the order and the sorted
+        keys into the linearization files."""
+        n_rows = self.con.execute("SELECT count(*) FROM keys").fetchone()[0]
+        key_columns = [f"key{i}" for i in range(int(np.prod(self.key_shape)))]
+        order_by = ", ".join(f"{column} ASC NULLS LAST" for column in key_columns)
+
+        order = np.lib.format.open_memmap(
+            file_name + ".order.npy.tmp", mode="w+", dtype=order_dtype, shape=(n_rows,)
+        )
+        keys = np.lib.format.open_memmap(
+            file_name + ".keys.npy.tmp",
+            mode="w+",
+            dtype=self.key_dtype,
+            shape=(n_rows, *self.key_shape),
         )
-        print(f"Saved linearized data in {file_name}")
+        query = f"SELECT * FROM keys ORDER BY {order_by}, row_index"
+        start = 0
+        for block in _fetch_blocks(self.con, query, block_size):
+            end = start + len(block)
+            order[start:end] = block["row_index"].to_numpy()
+            block_keys = block[key_columns].to_numpy(dtype=self.key_dtype)
+            keys[start:end] = block_keys.reshape(len(block), *self.key_shape)
+            start = end
+
+        for array, suffix in [(order, ".order.npy"), (keys, ".keys.npy")]:
+            array.flush()
+            os.replace(file_name + suffix + ".tmp", file_name + suffix)
+
+
+def _sortable(keys: np.ndarray) -> np.ndarray:
+    """Turns keys with several uint64 words per row into one-dimensional keys that numpy can sort
+    and search: big-endian words compare bytewise like the numbers they represent."""
+    keys = np.asarray(keys)
+    if keys.ndim == 1:
+        return keys
+    n_bytes = keys.shape[1] * keys.dtype.itemsize
+    return np.ascontiguousarray(keys.astype(">u8")).view(f"V{n_bytes}").ravel()
+
+
+def _write_columnar(linearization: np.ndarray, file_name: str, file_format: str):
+    """Writes one float64 column per attribute, named by the attribute's index."""
+    import pyarrow as pa
+
+    table = pa.table(
+        {str(i): linearization[:, i] for i in range(linearization.shape[1])}
+    )
+    if file_format == "arrow":
+        with pa.ipc.new_file(file_name, table.schema) as writer:
+            writer.write_table(table)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, file_name)
+    else:
+        raise ValueError(f"unknown file format {file_format}")
+
+
+def _to_float_array(data) -> np.ndarray:
+    """Converts (possibly object-typed) data into a float64 array that can be memory-mapped.
+    Values that are not numeric become NaN, mirroring what np.genfromtxt did for the csv files."""
+    try:
+        return np.ascontiguousarray(data, dtype=np.float64)
+    except (TypeError, ValueError):
+        df = pd.DataFrame(data).apply(pd.to_numeric, errors="coerce")
+        return np.ascontiguousarray(df.to_numpy(dtype=np.float64))
 
 
 class LinearizationRandom(Linearization):
     def linearize(self):
         order = np.argsort(np.random.rand(len(self.data)))
+        self.order = order
         self.linearization = self.data[order]
         self.write_data("Random")
         return self.linearization
 
 
 class LinearizationNumericAttr(Linearization):
+    # "numpy" sorts in memory, "duckdb" sorts out of core (see linearize_external)
+    engine = "numpy"
+    sorts_by_keys = True
+
     def __init__(
-        self, data_set_name, dimensions, sort_attr: int, exclude_attributes=[]
+        self,
+        data_set_name,
+        dimensions,
+        sort_attr: int,
+        exclude_attributes=[],
+        data=None,
     ):
-        super().__init__(data_set_name, dimensions, exclude_attributes)
+        super().__init__(data_set_name, dimensions, exclude_attributes, data)
         self.sort_attr = sort_attr
 
     def linearize(self):
-        order = np.argsort(self.data[:, self.sort_attr])
+        if self.engine == "duckdb":
+            return self.linearize_external("SortByNumAttr")
+
+        keys = self.get_keys(self.data)
+        order = np.argsort(keys)
+        self.order = order
+        self.keys = keys[order]
         self.linearization = self.data[order]
         self.write_data("SortByNumAttr")
         return self.linearization
 
+    def append(self):
+        return self.append_rows("SortByNumAttr")
+
+    def get_keys(self, data):
+        attr = pd.to_numeric(pd.Series(data[:, self.sort_attr]), errors="coerce")
+        return attr.to_numpy(dtype=np.float64)
+
 
 class LinearizationDatetimeAttr(LinearizationNumericAttr):
     def linearize(self):
+        if self.engine == "duckdb":
+            return self.linearize_external("SortByTempAttr")
+
         attr = self.data[:, self.sort_attr]
         attr_datetime = pd.to_datetime(attr)
         order = np.argsort(attr_datetime)
+        self.order = order
+        self.keys = self.get_keys(self.data)[order]
         self.linearization = self.data[order]
         self.write_data("SortByTempAttr")
         return self.linearization
 
+    def append(self):
+        return self.append_rows("SortByTempAttr")
+
+    def get_keys(self, data):
+        # nanoseconds since the epoch, missing dates are sorted last (like argsort does)
+        keys = np.asarray(pd.to_datetime(data[:, self.sort_attr]).asi8)
+        return np.where(keys == pd.NaT.value, np.iinfo(np.int64).max, keys)
+
 
 class LinearizationZOrder2D(Linearization):
+    # "vectorized" sorts by Morton keys, "comparator" uses the (much slower) pairwise comparison
+    engine = "vectorized"
+    bits = None  # bits per dimension of the Morton keys, None uses as many as needed
+
     def linearize(self):
         mins, maxs = self.find_extrema()
         diffs = maxs - mins
-        normalized_data = (self.data - mins) / diffs
+        normalized_data = (
+            np.asarray(self.data[:, 1:3], dtype=np.float64) - mins
+        ) / diffs
 
-        indexes = self.construct_z_order_2d(
-            list(range(len(normalized_data))), normalized_data[:, 1:3]
-        )
+        if self.engine == "vectorized":
+            indexes = z_order(normalized_data, self.bits)
+        else:
+            indexes = self.construct_z_order_2d(
+                list(range(len(normalized_data))), normalized_data
+            )
 
+        self.order = indexes
         self.linearization = self.data[indexes]
         self.write_data("ZOrder")
 
     def find_extrema(self):
-        data_dimension = len(self.data[0])
-        mins = np.full(data_dimension, float("inf"))
-        maxs = np.full(data_dimension, float("-inf"))
-
-        for data_point in self.data:
-            for attribute_index in range(data_dimension):
-                attribute = data_point[attribute_index]
-                if attribute < mins[attribute_index]:
-                    mins[attribute_index] = attribute
-                if attribute > maxs[attribute_index]:
-                    maxs[attribute_index] = attribute
-
-        return mins, maxs
+        # only of the two linearized dimensions, since other columns may not be numeric
+        data = np.asarray(self.data[:, 1:3], dtype=np.float64)
+        return np.nanmin(data, axis=0), np.nanmax(data, axis=0)
 
     def construct_z_order_2d(self, indexes, data):
         def compare(i, j):
@@ -157,33 +686,78 @@ class LinearizationZOrder2D(Linearization):
 
 
 class LinearizationZOrderKD(Linearization):
+    # "vectorized" sorts by Morton keys, "comparator" uses the (much slower) pairwise comparison,
+    # "duckdb" sorts by Morton keys out of core (see linearize_external)
+    engine = "vectorized"
+    bits = None  # bits per dimension of the Morton keys, None uses as many as needed
+    sorts_by_keys = True
+
     def linearize(self):
+        if self.engine == "duckdb":
+            return self.linearize_external("ZOrder")
+
         mins, maxs = self.find_extrema()
-        diffs = maxs - mins
-        normalized_data = (self.data - mins) / diffs
 
-        indexes = self.construct_z_order_kd(
-            list(range(len(normalized_data))),
-            normalized_data[:, 1 : self.dimensions + 1],
-        )
+        if self.engine == "vectorized":
+            # new rows are normalized by the same extrema, see get_keys
+            self.key_params = {
+                "mins": mins.tolist(),
+                "maxs": maxs.tolist(),
+                "bits": self.bits,
+            }
+            keys = self.get_keys(self.data)
+            indexes = np.lexsort(keys.T[::-1])
+            self.keys = keys[indexes]
+        else:
+            diffs = maxs - mins
+            data = np.asarray(self.data[:, 1 : self.dimensions + 1], dtype=np.float64)
+            normalized_data = (data - mins) / diffs
+            indexes = self.construct_z_order_kd(
+                list(range(len(normalized_data))), normalized_data
+            )
 
+        self.order = indexes
         self.linearization = self.data[indexes]
         self.write_data("ZOrder")
 
-    def find_extrema(self):
-        data_dimension = len(self.data[0])
-        mins = np.full(data_dimension, float("inf"))
-        maxs = np.full(data_dimension, float("-inf"))
+    def append(self):
+        return self.append_rows("ZOrder")
+
+    def fit_keys(self, blocks):
+        dims = slice(1, self.dimensions + 1)
+        mins = np.full(self.dimensions, np.inf)
+        maxs = np.full(self.dimensions, -np.inf)
+        for block in blocks():
+            mins = np.fmin(mins, np.nanmin(block[:, dims], axis=0))
+            maxs = np.fmax(maxs, np.nanmax(block[:, dims], axis=0))
+        self.key_params = {"mins": mins.tolist(), "maxs": maxs.tolist(), "bits": None}
+
+        # same bits as for all rows at once: as many as the block that needs most of them
+        bits = self.bits
+        if bits is None:
+            bits = max(
+                morton_bits((block[:, dims] - mins) / (maxs - mins))
+                for block in blocks()
+            )
+        self.key_params["bits"] = bits
 
-        for data_point in self.data:
-            for attribute_index in range(data_dimension):
-                attribute = data_point[attribute_index]
-                if attribute < mins[attribute_index]:
-                    mins[attribute_index] = attribute
-                if attribute > maxs[attribute_index]:
-                    maxs[attribute_index] = attribute
+    def get_keys(self, data):
+        """Morton keys of the rows, normalized by the extrema of the linearized data. Rows outside
+        of these extrema get the keys of the closest boundary."""
+        mins = np.array(self.key_params["mins"])
+        maxs = np.array(self.key_params["maxs"])
+        data = np.asarray(data[:, 1 : self.dimensions + 1], dtype=np.float64)
+        normalized_data = (data - mins) / (maxs - mins)
 
-        return mins, maxs
+        if self.key_params["bits"] is None:
+            # fix the bits, so that the keys of new rows have the same length
+            self.key_params["bits"] = morton_bits(normalized_data)
+        return morton_keys(normalized_data, self.key_params["bits"])
+
+    def find_extrema(self):
+        # only of the linearized dimensions, since other columns may not be numeric
+        data = np.asarray(self.data[:, 1 : self.dimensions + 1], dtype=np.float64)
+        return np.nanmin(data, axis=0), np.nanmax(data, axis=0)
 
     def construct_z_order_kd(self, indexes, data):
         def compare(i, j):
@@ -228,75 +802,355 @@ class LinearizationZOrderKD(Linearization):
         return np.array(indexes)
 
 
+def z_order(data: np.ndarray, bits: int = None) -> np.ndarray:
+    """Returns the indeces that sort the (normalized) data along the z-order curve. The order is
+    the same as that of the comparators in construct_z_order_2d/kd, with ties (i.e., identical
+    points) kept in input order."""
+    keys = morton_keys(data, bits)
+    # lexsort uses the last key as the primary one, so pass the most significant word last
+    return np.lexsort(keys.T[::-1])
+
+
+def morton_keys(data: np.ndarray, bits: int = None) -> np.ndarray:
+    """Computes the Morton keys of data normalized into [0, 1], as an array of uint64 words (most
+    significant word first). Each dimension is quantized into `bits` bits (rounded up to a
+    multiple of 32) and their bits are interleaved, with the last dimension as the most
+    significant one. Like the comparators, quantization bisects [0, 1] and puts values that lie
+    on a midpoint into the lower half. By default, as many bits are used as needed to tell apart
+    all distinct values. NaN values are treated as 0."""
+    M, exponents = _split_floats(data)
+    n_dims = M.shape[1]
+
+    if bits is None:
+        bits = _default_bits(M, exponents)
+    n_limbs = -(-bits // 32)
+    bits = n_limbs * 32
+
+    limbs = [
+        [
+            _get_limb(M[:, d], exponents[:, d], bits, limb_index)
+            for d in range(n_dims - 1, -1, -1)
+        ]
+        for limb_index in range(n_limbs)
+    ]
+    return _interleave(limbs, 32)
+
+
+def morton_bits(data: np.ndarray) -> int:
+    """Returns the bits per dimension that morton_keys uses by default for the data."""
+    return -(-_default_bits(*_split_floats(data)) // 32) * 32
+
+
+def _default_bits(M: np.ndarray, exponents: np.ndarray) -> int:
+    # values with smaller exponents need more bisection steps to be told apart
+    nonzero = exponents[M > 0]
+    return 53 - int(nonzero.min()) if len(nonzero) > 0 else 1
+
+
+def quantize(data: np.ndarray, bits: int) -> np.ndarray:
+    """Quantizes data normalized into [0, 1] into integers of up to 32 bits per dimension, using
+    the same bisection as morton_keys."""
+    M, exponents = _split_floats(data)
+    quantized = np.empty(M.shape, dtype=np.uint64)
+    for d in range(M.shape[1]):
+        quantized[:, d] = _get_limb(M[:, d], exponents[:, d], 32, 0)
+    return quantized >> np.uint64(32 - bits)
+
+
+def _split_floats(data: np.ndarray):
+    data = np.nan_to_num(np.asarray(data, dtype=np.float64), nan=0.0)
+    data = np.clip(data, 0.0, 1.0)
+
+    mantissas, exponents = np.frexp(data)
+    # data = M * 2^(exponents - 53), with integer M < 2^53 (and M = 0 for data = 0)
+    M = (mantissas * 2.0**53).astype(np.uint64)
+    return M, exponents
+
+
+def _interleave(limbs: list, bits_per_limb: int) -> np.ndarray:
+    """Interleaves the bits of several dimensions into uint64 words (most significant first).
+    limbs[t][d] holds bits_per_limb bits of dimension d, with limbs[0] holding the most
+    significant ones. On every level, the bit of the first dimension is the most significant."""
+    n_points = len(limbs[0][0])
+    n_bits = len(limbs) * len(limbs[0]) * bits_per_limb
+    words = [np.zeros(n_points, dtype=np.uint64) for _ in range(-(-n_bits // 64))]
+    word_index, bits_in_word = 0, 0
+
+    for limb in limbs:
+        for bit in range(bits_per_limb - 1, -1, -1):
+            for values in limb:
+                if bits_in_word == 64:
+                    word_index, bits_in_word = word_index + 1, 0
+                words[word_index] <<= np.uint64(1)
+                words[word_index] |= (values >> np.uint64(bit)) & np.uint64(1)
+                bits_in_word += 1
+
+    return np.stack(words, axis=1)
+
+
+def hilbert_order(data: np.ndarray, bits: int = None) -> np.ndarray:
+    """Returns the indeces that sort the (normalized) data along the Hilbert curve. Ties (i.e.,
+    points in the same cell) are kept in input order."""
+    keys = hilbert_keys(data, bits)
+    return np.lexsort(keys.T[::-1])
+
+
+def hilbert_keys(data: np.ndarray, bits: int = None) -> np.ndarray:
+    """Computes the k-dimensional Hilbert indeces of data normalized into [0, 1], as an array of
+    uint64 words (most significant word first). Each dimension is quantized into `bits` bits (at
+    most 32, by default as many as fit into a single word). Uses Skilling's transform ("Programming
+    the Hilbert curve", 2004), applied to all points at once."""
+    n_dims = data.shape[1]
+    if bits is None:
+        bits = min(max(64 // n_dims, 1), 32)
+
+    X = quantize(data, bits)
+    X = [X[:, d].copy() for d in range(n_dims)]
+
+    # inverse undo excess work
+    Q = np.uint64(1) << np.uint64(bits - 1)
+    while Q > 1:
+        P = Q - np.uint64(1)
+        for i in range(n_dims):
+            is_set = (X[i] & Q) != 0
+            t = (X[0] ^ X[i]) & P
+            X[0] = np.where(is_set, X[0] ^ P, X[0] ^ t)
+            if i > 0:
+                X[i] = np.where(is_set, X[i], X[i] ^ t)
+        Q >>= np.uint64(1)
+
+    # gray encode
+    for i in range(1, n_dims):
+        X[i] ^= X[i - 1]
+    t = np.zeros_like(X[0])
+    Q = np.uint64(1) << np.uint64(bits - 1)
+    while Q > 1:
+        t = np.where((X[n_dims - 1] & Q) != 0, t ^ (Q - np.uint64(1)), t)
+        Q >>= np.uint64(1)
+    X = [x ^ t for x in X]
+
+    # the transposed index holds the bits of the Hilbert index in interleaved order
+    return _interleave([X], bits)
+
+
+def _get_limb(M: np.ndarray, exponents: np.ndarray, bits: int, limb_index: int):
+    """Returns bits [lo, lo + 32) of the quantized values p = ceil(v * 2^bits) - 1 (and p = 0 for
+    v = 0), where v = M * 2^(exponents - 53) and lo = bits - 32 * (limb_index + 1). Since
+    p = ((M - 1) << s) | ((1 << s) - 1) for s = bits + exponents - 53, these bits are M - 1 shifted
+    by s - lo, followed by up to s - lo one bits."""
+    lo = bits - 32 * (limb_index + 1)
+    r = exponents.astype(np.int64) + (bits - 53 - lo)
+
+    M_ = np.where(M > 0, M - np.uint64(1), np.uint64(0))
+    shifted = np.where(
+        r >= 0,
+        M_ << np.clip(r, 0, 64).astype(np.uint64),
+        M_ >> np.clip(-r, 0, 64).astype(np.uint64),
+    )
+    ones = (np.uint64(1) << np.clip(r, 0, 32).astype(np.uint64)) - np.uint64(1)
+    limb = (shifted | ones) & np.uint64(0xFFFFFFFF)
+    return np.where(M > 0, limb, np.uint64(0))
+
+
+class LinearizationHilbert(Linearization):
+    bits = None  # bits per dimension of the Hilbert keys, None fits them into a single word
+
+    def linearize(self):
+        # only the linearized dimensions, since other columns may not be numeric
+        data = np.asarray(self.data[:, 1 : self.dimensions + 1], dtype=np.float64)
+        mins, maxs = np.nanmin(data, axis=0), np.nanmax(data, axis=0)
+        normalized_data = (data - mins) / (maxs - mins)
+
+        indexes = hilbert_order(normalized_data, self.bits)
+
+        self.order = indexes
+        self.linearization = self.data[indexes]
+        self.write_data("Hilbert")
+        return self.linearization
+
+
 class LinearizationNearestNeighbour(Linearization):
+    def __init__(
+        self,
+        data_set_name,
+        dimensions,
+        exclude_attributes=[],
+        n_neighbours: int = 50,
+        start_index: int = 0,
+        metric: str = "euclidean",
+        n_jobs: int = -1,
+        batch_size: int = 100_000,
+        data=None,
+    ):
+        super().__init__(data_set_name, dimensions, exclude_attributes, data)
+        self.n_neighbours = n_neighbours  # neighbours precomputed per point
+        self.start_index = start_index  # point the tour starts at
+        self.metric = metric
+        self.n_jobs = n_jobs  # cores used for the neighbour queries (-1 uses all cores)
+        # points per neighbour query, which bounds its memory footprint
+        self.batch_size = batch_size
+
     def linearize(self):
         data_dim = self.data[:, 1 : self.dimensions + 1]
-        indexes = self.construct_nn_order_kd(data_dim)
+        indexes = self.construct_nn_order_kd(np.asarray(data_dim, dtype=np.float64))
 
+        self.order = indexes
         self.linearization = self.data[indexes]
         self.write_data("NN")
 
     def construct_nn_order_kd(self, data):
+        """Greedy nearest-neighbour tour through the data: from the current point, always move to
+        the closest point that was not visited yet. The closest points are precomputed for every
+        point. Only if all of them were visited, the closest unvisited point is queried from a
+        tree over the unvisited points, which is rebuilt once half of its points were visited."""
         no_of_points = len(data)
         visited = np.full(no_of_points, False)
+        indexes = np.empty(no_of_points, dtype=np.int64)
 
-        indexes = np.full(no_of_points, None)
-
-        current_index = 0  # <-- Hardcoded (0)
-
+        current_index = self.start_index
+        visited[current_index] = True
         indexes[0] = current_index
-        counter = 1
 
-        no_of_neighbours = 50  # <-- Hardcoded (50)
-        kdt = KDTree(
-            data, leaf_size=30, metric="euclidean"
-        )  # <-- Hardcoded (euclidean)
-        neighbours = kdt.query(data, k=no_of_neighbours, return_distance=False)
+        neighbours = self.query_neighbours(data)
+        unvisited_tree = _UnvisitedTree(data, self.metric)
 
-        for iter in range(no_of_points - 1):
+        for counter in range(1, no_of_points):
             current_neighbours = neighbours[current_index]
+            candidates = current_neighbours[~visited[current_neighbours]]
 
-            found = False
-            for close in current_neighbours:
-                if not visited[close] and not close == current_index:
-                    found = True
-                    visited[close] = True
-                    indexes[counter] = close
-                    counter += 1
-                    current_index = close
-                    break
-
-            if not found:
-                current_point = data[current_index]
-                all_neighbours = kdt.query(
-                    current_point.reshape(1, -1), k=no_of_points, return_distance=False
-                )
-                for close in all_neighbours[0]:
-                    if not visited[close] and not close == current_index:
-                        visited[close] = True
-                        indexes[counter] = close
-                        counter += 1
-                        current_index = close
-                        break
+            if len(candidates) > 0:
+                current_index = candidates[0]
+            else:
+                current_index = unvisited_tree.query(data[current_index], visited)
+
+            visited[current_index] = True
+            unvisited_tree.visit()
+            indexes[counter] = current_index
+
+        return indexes
 
-        return indexes.astype(int)
+    def query_neighbours(self, data) -> np.ndarray:
+        """Returns the n_neighbours closest points of every point (in order of distance), queried
+        in batches of batch_size points on n_jobs cores."""
+        k = min(self.n_neighbours, len(data))
+        nn = NearestNeighbors(
+            n_neighbors=k, leaf_size=30, metric=self.metric, n_jobs=self.n_jobs
+        ).fit(data)
+
+        dtype = np.int32 if len(data) < 2**31 else np.int64
+        neighbours = np.empty((len(data), k), dtype=dtype)
+        for start in range(0, len(data), self.batch_size):
+            batch = data[start : start + self.batch_size]
+            neighbours[start : start + len(batch)] = nn.kneighbors(
+                batch, return_distance=False
+            )
+
+        return neighbours
+
+
+class _UnvisitedTree:
+    """KD-tree over the points that were unvisited when it was (re)built. Queries ask for more and
+    more neighbours until they find an unvisited one. Since the tree is rebuilt once half of its
+    points were visited, this costs O(n log n) amortized over a whole tour."""
+
+    def __init__(self, data, metric):
+        self.data = data
+        self.metric = metric
+        self.points = None
+        self.tree = None
+        self.n_visited = 0
+
+    def visit(self):
+        """Counts a point that was marked visited, which was unvisited when the tree was built."""
+        self.n_visited += 1
+
+    def query(self, point, visited) -> int:
+        if self.tree is None or self.n_visited * 2 > len(self.points):
+            self.points = np.flatnonzero(~visited)
+            self.n_visited = 0
+            self.tree = KDTree(self.data[self.points], leaf_size=30, metric=self.metric)
+
+        k = 1
+        while True:
+            k = min(k * 2, len(self.points))
+            closest = self.tree.query(point.reshape(1, -1), k=k, return_distance=False)
+            closest = self.points[closest[0]]
+            candidates = closest[~visited[closest]]
+
+            if len(candidates) > 0:
+                return candidates[0]
 
 
 class LinearizationGeoZorder(Linearization):
+    sorts_by_keys = True
+
     def __init__(
-        self, data_set_name, dimensions, lat: int, lng: int, exclude_attributes=[]
+        self,
+        data_set_name,
+        dimensions,
+        lat: int,
+        lng: int,
+        exclude_attributes=[],
+        precision: int = 32,
+        data=None,
     ):
-        super().__init__(data_set_name, dimensions, exclude_attributes)
+        super().__init__(data_set_name, dimensions, exclude_attributes, data)
         self.lat = lat  # attribute containing latitude
         self.lng = lng  # attribute containing longitude
+        self.precision = precision  # bits per coordinate, pymorton uses 32
 
     def linearize(self):
         # this generates a hash for every element of the data, and sorting by that hash gives
         # the zorder of the data
-        hashes = pd.DataFrame(self.data).apply(
-            lambda row: pm.interleave_latlng(row[self.lat], row[self.lng]), axis=1
-        )
-        order = np.argsort(hashes)
+        hashes = self.get_keys(self.data)
+        order = np.argsort(hashes, kind="stable")
+        self.order = order
+        self.keys = hashes[order]
         self.linearization = self.data[order]
         self.write_data("ZOrder")  # same as non-spatial z-order
         return self.linearization
+
+    def append(self):
+        return self.append_rows("ZOrder")
+
+    def get_keys(self, data):
+        return geo_morton_keys(data[:, self.lat], data[:, self.lng], self.precision)
+
+
+def geo_morton_keys(
+    lat: np.ndarray, lng: np.ndarray, precision: int = 32
+) -> np.ndarray:
+    """Vectorized version of pymorton's interleave_latlng, which returns uint64 keys instead of
+    strings of base-4 digits. Sorting by the keys gives the same order as sorting by pymorton's
+    hashes, truncated to the first `precision` digits (at most 32)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+
+    # like pymorton, wrap coordinates outside of the valid ranges and shift them to start at 0
+    x = np.where(
+        lng > 180,
+        np.mod(lng, 180) + 180.0,
+        np.where(lng < -180, -np.mod(-lng, 180) + 180.0, lng + 180.0),
+    )
+    y = np.where(
+        lat > 90,
+        np.mod(lat, 90) + 90.0,
+        np.where(lat < -90, -np.mod(-lat, 90) + 90.0, lat + 90.0),
+    )
+
+    quantized = [_quantize_degrees(y), _quantize_degrees(x)]
+    quantized = [q >> np.uint64(32 - precision) for q in quantized]
+    return _interleave([quantized], precision)[:, 0]
+
+
+def _quantize_degrees(values: np.ndarray) -> np.ndarray:
+    """Computes the 32 binary digits that pymorton derives by greedily subtracting 180 * 2^-i,
+    i.e., floor(values * 2^31 / 180) in exact arithmetic, capped at 32 bits. NaN becomes 0."""
+    values = np.nan_to_num(values, nan=0.0)
+
+    # values * 2^29 is exact, and so is q * 45 < 2^53, so correct the rounding of the division
+    scaled = values * 2.0**29
+    q = np.floor(scaled / 45.0)
+    q = np.where(q * 45.0 > scaled, q - 1, q)
+    q = np.where((q + 1) * 45.0 <= scaled, q + 1, q)
+    return np.clip(q, 0, 2**32 - 1).astype(np.uint64)
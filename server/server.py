@@ -1,7 +1,7 @@
 from flask import Flask, abort, jsonify, request
 import numpy as np
 from datetime import datetime
-from pipeline import Pipeline
+from pipeline import Pipeline, LINEARIZATION_CACHE, SUBDIVISION_CACHE
 
 app = Flask(__name__)
 
@@ -54,6 +54,10 @@ def get_pipeline_config(req):
         "data": req.args.get("data"),
         "dimension": req.args.get("dimension"),
         "params": params,
+        "streaming": req.args.get("streaming") == "true",
+        "persist_subdivisions": req.args.get("persist_subdivisions") == "true",
+        "latency_budget": req.args.get("latency_budget"),
+        "chunk_dtype": req.args.get("chunk_dtype"),
     }
 
     return configuration
@@ -153,7 +157,10 @@ def sample(id):
         abort(400)
 
     next_chunk = pipeline.get_next_chunk()
-    return produce_response_for_sample(next_chunk.tolist())
+    # the progression is over once all rows have been sampled
+    return produce_response_for_sample(
+        [] if next_chunk is None else next_chunk.tolist()
+    )
 
 
 @app.route("/all_data/<id>", methods=["GET"])
@@ -169,6 +176,18 @@ def get_all_data(id):
     return cors_response(all_data.tolist())
 
 
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    # hit/miss/eviction counters of the linearizations shared by all pipelines
+    return cors_response(LINEARIZATION_CACHE.get_stats())
+
+
+@app.route("/subdivision_cache_stats", methods=["GET"])
+def subdivision_cache_stats():
+    # hit/miss/eviction counters of the subdivisions shared by all pipelines
+    return cors_response(SUBDIVISION_CACHE.get_stats())
+
+
 @app.route("/reset", methods=["GET"])
 def reset_pipelines():
     global PIPELINES
@@ -188,5 +207,16 @@ def data_size(id):
     return cors_response(dataset_size)
 
 
+@app.route("/info/<id>", methods=["GET"])
+def info(id):
+    pipeline = PIPELINES.get(id)
+
+    if pipeline is None:
+        print("couldn't find pipeline with id", id)
+        abort(400)
+
+    return cors_response(pipeline.get_info())
+
+
 if __name__ == "__main__":
     app.run(debug=True)
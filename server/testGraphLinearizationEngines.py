@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/pipeline/linearizations")
+from GraphLinearizations import *
+
+# Checks that the sparse engine of the graph linearizations returns the same order as the networkx
+# engine, on generated graphs with duplicate edges, self-loops and several components, and with
+# node ids that are neither contiguous nor in the order of their appearance. Graphs on which the
+# networkx engine fails (e.g., when the rewired edges end in a cycle) are skipped. The linearization
+# files are written to a temporary folder.
+# Usage: python testGraphLinearizationEngines.py [n_graphs]
+N_GRAPHS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+LINEARIZATIONS = [
+    BasicGraphLinearization,
+    SpanningTreeGraphLinearization,
+    WeightedGraphLinearization,
+]
+
+
+def generate_graph(rng):
+    """Returns a small random graph as data array with the columns id, source, target."""
+    n_nodes = int(rng.integers(2, 300))
+    n_edges = int(rng.integers(1, 3 * n_nodes))
+    node_ids = rng.permutation(n_nodes) * 3
+    edges = node_ids[rng.integers(0, n_nodes, (n_edges, 2))]
+    return np.column_stack([np.arange(n_edges), edges])
+
+
+def linearize(linearization_class, engine, data):
+    linearization = linearization_class("testGraph", 2, data=data)
+    linearization.engine = engine
+    try:
+        return np.asarray(linearization.linearize())
+    except Exception:
+        return None
+
+
+rng = np.random.default_rng(0)
+n_compared = {linearization_class: 0 for linearization_class in LINEARIZATIONS}
+with tempfile.TemporaryDirectory() as folder:
+    Linearization.files_folder = folder
+    for _ in range(N_GRAPHS):
+        data = generate_graph(rng)
+        for linearization_class in LINEARIZATIONS:
+            expected = linearize(linearization_class, "networkx", data)
+            if expected is None:
+                continue
+
+            result = linearize(linearization_class, "sparse", data)
+            assert np.array_equal(result, expected), (
+                linearization_class.__name__,
+                data,
+            )
+            n_compared[linearization_class] += 1
+
+for linearization_class, n in n_compared.items():
+    print(f"{linearization_class.__name__:<32} same order on {n} of {N_GRAPHS} graphs")
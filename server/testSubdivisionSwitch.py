@@ -0,0 +1,71 @@
+import pathlib
+import sys
+import tempfile
+
+import numpy as np
+
+from pipeline import *
+
+# Checks that switching the subdivision during a progression never emits a row twice: the rows of
+# the test dataset are sampled in chunks until none are left, while the subdivision (and at times
+# the selection) is switched at several points, including back to subdivisions used before. The
+# emitted rows must cover the whole dataset, each exactly once. Runs both with and without
+# streaming, on a generated dataset in a temporary folder.
+# Usage: python testSubdivisionSwitch.py [chunk_size]
+CHUNK_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+DATASET_SIZE = 5000
+
+# the subdivision and selection switched to after the given number of chunks
+SWITCHES = {
+    3: (SubdivisionInterval(40, 1), None),
+    7: (SubdivisionRandom(30), SelectionMinimum(2)),
+    12: (SubdivisionCardinality(100), None),
+    15: (SubdivisionCohesion([1, 2], 10), SelectionMaximum(2)),
+    20: (SubdivisionInterval(40, 1), SelectionMedian(3)),
+    26: (SubdivisionCoverage(3), SelectionRandom()),
+    30: (SubdivisionCardinality(100), SelectionFirst()),
+}
+
+
+def sample_progression(streaming):
+    """Returns the ids of all rows emitted until the sampler has no rows left."""
+    selection = SelectionRandom()
+    sampler = Sampler(
+        TEST,
+        LinearizationReaderTest(),
+        SubdivisionCardinality(100),
+        selection,
+        streaming=streaming,
+        block_size=1000,
+    )
+    ids = []
+    while True:
+        if len(ids) in SWITCHES:
+            subdivision, new_selection = SWITCHES[len(ids)]
+            sampler.update_subdivision(subdivision)
+            if new_selection is not None:
+                selection = new_selection
+                sampler.update_selection(selection)
+
+        chunk = sampler.sample(selection, CHUNK_SIZE)
+        if chunk is None or len(chunk) == 0:
+            return np.concatenate(ids), sampler.get_dataset_size()
+        ids.append(np.asarray(chunk[:, 0], dtype=np.int64))
+
+
+with tempfile.TemporaryDirectory() as folder:
+    # rows with an id and four random attributes, in the legacy csv format
+    LinearizationReader.files_folder = pathlib.Path(folder)
+    data = np.random.default_rng(0).random((DATASET_SIZE, 5))
+    data[:, 0] = np.arange(DATASET_SIZE)
+    np.savetxt(
+        LinearizationReaderTest().get_file_path(TEST), data, delimiter=";", header="h"
+    )
+
+    for streaming in [False, True]:
+        ids, dataset_size = sample_progression(streaming)
+        assert len(np.unique(ids)) == len(ids), "rows were emitted more than once"
+        assert np.array_equal(
+            np.sort(ids), np.arange(dataset_size)
+        ), "rows were not emitted"
+        print(f"streaming={streaming}: all {dataset_size} rows emitted exactly once")